@@ -0,0 +1,59 @@
+"""
+Cost per message of the ECU anomaly detection for growing fleets. Every vehicle
+sends a reading per second and batches hold the readings of one batch interval:
+
+    python -m benchmarks.anomaly_detection --vehicles 100,1000,10000,100000
+"""
+
+import time
+
+import numpy as np
+
+from mqtt_vehicle_fleet_sensor_data.publishers.vehicle_base import ECU_READINGS
+from mqtt_vehicle_fleet_sensor_data.subscribers.anomaly_detector import (
+    AnomalyDetector,
+)
+import typer
+
+# Normal ranges of the simulated readings, in `ECU_READINGS` order
+NORMAL_LOW = np.array([10.0, 10.0, 0.6, 0.5, 0.1, 100.0])
+NORMAL_HIGH = np.array([40.0, 40.0, 1.9, 4.5, 0.9, 120.0])
+
+
+def measure(vehicle_number: int, seconds: int, batch_interval: float) -> float:
+    """Microseconds spent per message."""
+    rng = np.random.default_rng(0)
+    detector = AnomalyDetector()
+    vehicle_ids = [f"van-{i}" for i in range(vehicle_number)]
+    batch_size = max(int(vehicle_number * batch_interval), 1)
+
+    messages = 0
+    elapsed = 0.0
+    for second in range(seconds):
+        values = rng.uniform(
+            NORMAL_LOW, NORMAL_HIGH, (vehicle_number, len(ECU_READINGS))
+        )
+        timestamps = np.full(vehicle_number, float(second))
+        for start in range(0, vehicle_number, batch_size):
+            batch = slice(start, start + batch_size)
+            started = time.perf_counter()
+            detector.evaluate(vehicle_ids[batch], timestamps[batch], values[batch])
+            elapsed += time.perf_counter() - started
+            messages += len(vehicle_ids[batch])
+
+    return elapsed / messages * 1e6
+
+
+def main(
+    vehicles: str = "100,1000,10000,100000",
+    seconds: int = 20,
+    batch_interval: float = 0.5,
+):
+    print(f"{'vehicles':>8} {'us/message':>10}")
+    for vehicle_number in [int(n) for n in vehicles.split(",")]:
+        cost = measure(vehicle_number, seconds, batch_interval)
+        print(f"{vehicle_number:>8} {cost:>10.2f}")
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,66 @@
+"""
+Time-to-first-publish of the vehicle workers for each start method.
+
+A vehicle counts as publishing once its worker has built the vehicle and
+serialised the first payload that would be handed to the MQTT client, so the
+numbers exclude the broker connection and can be measured without brokers:
+
+    python -m benchmarks.time_to_first_publish --vehicles 1,100,1000
+"""
+
+import json
+import time
+
+from mqtt_vehicle_fleet_sensor_data.publishers.create_mqtt_publishers import (
+    StartMethod,
+    VehicleType,
+    build_vehicle,
+    create_executor,
+)
+
+ROUTE = "dublin-limerick"
+
+
+def first_publish(id: str, vehicle_type: VehicleType, route: str) -> float:
+    vehicle = build_vehicle(id, vehicle_type, route)
+    for event in vehicle.collect_data().values():
+        json.dumps(event["msg"])
+    # CLOCK_MONOTONIC is shared by all processes, so it can be compared with the parent
+    return time.monotonic()
+
+
+def measure(vehicle_number: int, start_method: StartMethod) -> dict:
+    start = time.monotonic()
+    with create_executor(vehicle_number, start_method, [ROUTE]) as executor:
+        futures = [
+            executor.submit(first_publish, f"van-{i}", VehicleType.VAN, ROUTE)
+            for i in range(1, vehicle_number + 1)
+        ]
+        first_publish_times = sorted(future.result() - start for future in futures)
+
+    return {
+        "first": first_publish_times[0],
+        "median": first_publish_times[len(first_publish_times) // 2],
+        "last": first_publish_times[-1],
+    }
+
+
+def main(vehicles: str = "1,100,1000", start_methods: str = "spawn,forkserver,fork"):
+    print(
+        f"{'vehicles':>8} {'start method':>12} {'first':>8} {'median':>8} {'last':>8}"
+    )
+    for vehicle_number in [int(n) for n in vehicles.split(",")]:
+        for start_method in [StartMethod(m) for m in start_methods.split(",")]:
+            result = measure(vehicle_number, start_method)
+            print(
+                f"{vehicle_number:>8} {start_method.value:>12} "
+                f"{result['first']:>7.3f}s {result['median']:>7.3f}s "
+                f"{result['last']:>7.3f}s"
+            )
+
+
+if __name__ == "__main__":
+    # Only needed by the CLI, keep it out of the workers' import path
+    import typer
+
+    typer.run(main)
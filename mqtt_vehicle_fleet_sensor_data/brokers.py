@@ -0,0 +1,106 @@
+from bisect import bisect
+import hashlib
+import tomllib
+
+# Endpoints used when no broker pool is configured, see docker-compose.yaml
+DEFAULT_BROKER_POOL = {
+    "fleet": ["localhost:1883"],
+    "vans": ["localhost:1884"],
+    "trucks": ["localhost:1885"],
+}
+
+
+def _hash(key: str) -> int:
+    # Stable across processes and runs, unlike the built-in hash()
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+def parse_endpoint(endpoint: str) -> dict:
+    """Parse a `host:port` string."""
+    host, _, port = endpoint.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"Invalid broker endpoint '{endpoint}', expected host:port")
+    return {"host": host, "port": int(port)}
+
+
+class HashRing:
+    """Consistent hashing ring mapping keys (vehicle ids) onto broker endpoints."""
+
+    def __init__(self, endpoints: list, replicas: int = 100) -> None:
+        """
+        Args:
+            endpoints (list): Endpoints as dicts with `host` and `port`.
+            replicas (int): Virtual nodes per endpoint. More replicas spread the
+                keys more evenly between endpoints.
+        """
+        if not endpoints:
+            raise ValueError("A hash ring needs at least one endpoint")
+
+        self.endpoints = endpoints
+        ring = sorted(
+            (_hash(f"{endpoint['host']}:{endpoint['port']}#{replica}"), index)
+            for index, endpoint in enumerate(endpoints)
+            for replica in range(replicas)
+        )
+        self._hashes = [node_hash for node_hash, _ in ring]
+        self._indexes = [index for _, index in ring]
+
+    def get_endpoint(self, key: str) -> dict:
+        # First virtual node clockwise from the key, wrapping around the ring
+        position = bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self.endpoints[self._indexes[position]]
+
+
+class BrokerPool:
+    """Logical brokers (`fleet`, `vans`, `trucks`), each backed by N endpoints."""
+
+    def __init__(self, brokers: dict = None) -> None:
+        """
+        Args:
+            brokers (dict): Logical broker name to a list of `host:port` strings.
+        """
+        brokers = brokers if brokers is not None else DEFAULT_BROKER_POOL
+        self.rings = {
+            name: HashRing([parse_endpoint(endpoint) for endpoint in endpoints])
+            for name, endpoints in brokers.items()
+        }
+
+    @classmethod
+    def from_file(cls, file_path: str) -> "BrokerPool":
+        """
+        Load a pool from a TOML file. Logical brokers missing from the file keep
+        their default endpoint:
+
+            [brokers]
+            fleet = ["localhost:1883", "localhost:1886"]
+        """
+        with open(file_path, "rb") as file:
+            brokers = tomllib.load(file).get("brokers", {})
+
+        # A misspelt name would leave the real logical broker on its default
+        unknown = set(brokers) - set(DEFAULT_BROKER_POOL)
+        if unknown:
+            raise ValueError(
+                f"Unknown logical brokers in {file_path}: {sorted(unknown)}, "
+                f"use {sorted(DEFAULT_BROKER_POOL)}"
+            )
+        for name, endpoints in brokers.items():
+            if (
+                not isinstance(endpoints, list)
+                or not endpoints
+                or not all(isinstance(endpoint, str) for endpoint in endpoints)
+            ):
+                raise ValueError(
+                    f"Broker '{name}' in {file_path} must be a non-empty list of "
+                    f"host:port strings, got {endpoints!r}"
+                )
+
+        return cls({**DEFAULT_BROKER_POOL, **brokers})
+
+    def get_broker(self, name: str, vehicle_id: str) -> dict:
+        """Broker config of the endpoint serving `vehicle_id` on a logical broker."""
+        return {"name": name, **self.rings[name].get_endpoint(vehicle_id)}
+
+    def get_endpoints(self, name: str) -> list:
+        """Every shard of a logical broker."""
+        return list(self.rings[name].endpoints)
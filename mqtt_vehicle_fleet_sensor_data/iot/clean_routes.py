@@ -0,0 +1,291 @@
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import csv
+from itertools import islice
+import json
+import math
+import os
+import sys
+
+from mqtt_vehicle_fleet_sensor_data.iot.routes import CLEAN_ROUTES_PATH
+from mqtt_vehicle_fleet_sensor_data.utils import EARTH_RADIUS_KM, haversine_distance
+
+RAW_ROUTES_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "coordinates/raw-routes"
+)
+
+
+def read_raw_route(file_path: str, chunk_size: int):
+    """
+    Stream a raw route in chunks of (lat, lon) points.
+
+    Raw routes are headerless `lat, lon, place-name` rows. The first rows name
+    the waypoints the route was planned with, they are not part of the path and
+    are the only rows with a place name, so those are skipped.
+    """
+    with open(file_path, newline="") as file:
+        reader = csv.reader(file, skipinitialspace=True)
+        while chunk := list(islice(reader, chunk_size)):
+            yield [
+                (float(row[0]), float(row[1]))
+                for row in chunk
+                if row and not (len(row) > 2 and row[2].strip())
+            ]
+
+
+def drop_duplicates_and_outliers(
+    chunks, max_step_km: float, dropped: Counter = None, max_outliers: int = 3
+):
+    """
+    Yield points skipping consecutive duplicates and points further than
+    `max_step_km` from the previous kept point. Routes go back over their own
+    path, so only consecutive duplicates are dropped.
+
+    A glitch is a point or two off the path. When `max_outliers` points in a row
+    are too far from the last kept point but close to each other, the raw route
+    really jumps there (a gap in the data), so they are kept and the route goes
+    on from them instead of every later point being dropped.
+
+    Args:
+        dropped (Counter): If given, counts the dropped `duplicates` and
+            `outliers` and the `gaps` the route went on after.
+    """
+    dropped = dropped if dropped is not None else Counter()
+    previous = None
+    outliers = []  # Consecutive outliers close to each other
+    for chunk in chunks:
+        for point in chunk:
+            if point == (outliers[-1] if outliers else previous):
+                dropped["duplicates"] += 1
+                continue
+
+            if previous is None or haversine_distance(previous, point) <= max_step_km:
+                dropped["outliers"] += len(outliers)
+                outliers = []
+                previous = point
+                yield point
+                continue
+
+            if outliers and haversine_distance(outliers[-1], point) > max_step_km:
+                dropped["outliers"] += len(outliers)
+                outliers = []
+            outliers.append(point)
+            if len(outliers) >= max_outliers:
+                dropped["gaps"] += 1
+                yield from outliers
+                previous = outliers[-1]
+                outliers = []
+
+    dropped["outliers"] += len(outliers)
+
+
+def _to_meters(point, origin) -> tuple:
+    # Equirectangular projection around the origin, accurate enough at route scale
+    lat, lon = map(math.radians, point)
+    origin_lat, origin_lon = map(math.radians, origin)
+    x = (lon - origin_lon) * math.cos(origin_lat) * EARTH_RADIUS_KM * 1000
+    y = (lat - origin_lat) * EARTH_RADIUS_KM * 1000
+    return x, y
+
+
+def _distance_to_segment(point, start, end) -> float:
+    (x, y), (x1, y1), (x2, y2) = point, start, end
+    dx, dy = x2 - x1, y2 - y1
+    if dx == dy == 0:
+        return math.hypot(x - x1, y - y1)
+    t = max(0.0, min(1.0, ((x - x1) * dx + (y - y1) * dy) / (dx * dx + dy * dy)))
+    return math.hypot(x - (x1 + t * dx), y - (y1 + t * dy))
+
+
+def simplify(points: list, tolerance_m: float) -> list:
+    """Ramer-Douglas-Peucker simplification keeping points within `tolerance_m`."""
+    if len(points) < 3:
+        return list(points)
+
+    projected = [_to_meters(point, points[0]) for point in points]
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+
+    # Iterative instead of recursive, long routes would exceed the recursion limit
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        max_distance, farthest = 0.0, None
+        for index in range(first + 1, last):
+            distance = _distance_to_segment(
+                projected[index], projected[first], projected[last]
+            )
+            if distance > max_distance:
+                max_distance, farthest = distance, index
+
+        if farthest is not None and max_distance > tolerance_m:
+            keep[farthest] = True
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def resample(points, distance_m: float):
+    """Yield points every `distance_m` along the route, interpolating between points."""
+    step_km = distance_m / 1000
+    previous = None
+    remaining_km = 0.0  # Distance left until the next sample
+    for point in points:
+        if previous is None:
+            yield point
+            previous, remaining_km = point, step_km
+            continue
+
+        segment_km = haversine_distance(previous, point)
+        travelled_km = 0.0
+        while segment_km - travelled_km >= remaining_km:
+            travelled_km += remaining_km
+            fraction = travelled_km / segment_km
+            yield (
+                previous[0] + (point[0] - previous[0]) * fraction,
+                previous[1] + (point[1] - previous[1]) * fraction,
+            )
+            remaining_km = step_km
+        remaining_km -= segment_km - travelled_km
+        previous = point
+
+
+def write_route(route: str, points, output_dir: str) -> dict:
+    """
+    Write a route as `<route>-clean.csv`, as `<route>-clean.bin` (little-endian
+    float64 lat, lon pairs, see `routes.load_route`) and its metadata as
+    `<route>-clean.json`. Returns the metadata.
+    """
+    coords = array("d")
+    length_km = 0.0
+    previous = None
+    min_lat = min_lon = math.inf
+    max_lat = max_lon = -math.inf
+
+    csv_path = os.path.join(output_dir, f"{route}-clean.csv")
+    with open(csv_path, "w", newline="") as file:
+        writer = csv.writer(file, lineterminator="\n")
+        writer.writerow(["lat", "lon"])
+        for point in points:
+            writer.writerow(point)
+            coords.extend(point)
+            if previous is not None:
+                length_km += haversine_distance(previous, point)
+            previous = point
+            min_lat, max_lat = min(min_lat, point[0]), max(max_lat, point[0])
+            min_lon, max_lon = min(min_lon, point[1]), max(max_lon, point[1])
+
+    if sys.byteorder == "big":
+        coords.byteswap()
+    with open(os.path.join(output_dir, f"{route}-clean.bin"), "wb") as file:
+        coords.tofile(file)
+
+    metadata = {
+        "route": route,
+        "point_count": len(coords) // 2,
+        "length_km": round(length_km, 3),
+        "bbox": {
+            "min_lat": min_lat,
+            "min_lon": min_lon,
+            "max_lat": max_lat,
+            "max_lon": max_lon,
+        },
+    }
+    with open(os.path.join(output_dir, f"{route}-clean.json"), "w") as file:
+        json.dump(metadata, file, indent=2)
+        file.write("\n")
+
+    return metadata
+
+
+def clean_route(
+    raw_file_path: str,
+    output_dir: str,
+    chunk_size: int,
+    max_step_km: float,
+    simplify_tolerance: float = None,
+    resample_distance: float = None,
+) -> dict:
+    route = os.path.basename(raw_file_path).removesuffix("-raw.csv")
+
+    dropped = Counter()
+    points = drop_duplicates_and_outliers(
+        read_raw_route(raw_file_path, chunk_size), max_step_km, dropped
+    )
+    if simplify_tolerance:
+        # Simplification needs the whole route, the other steps stream
+        points = simplify(list(points), simplify_tolerance)
+    elif resample_distance:
+        points = resample(points, resample_distance)
+
+    metadata = write_route(route, points, output_dir)
+    return {**metadata, "dropped": dict(dropped)}
+
+
+def main(
+    routes: list[str] = None,
+    raw_dir: str = RAW_ROUTES_PATH,
+    output_dir: str = CLEAN_ROUTES_PATH,
+    chunk_size: int = 1000,
+    max_step_km: float = 5.0,
+    simplify_tolerance: float = None,
+    resample_distance: float = None,
+    workers: int = None,
+):
+    # Routes are the raw file names without `-raw.csv`, all of them by default.
+    # Optionally simplify (tolerance in m) or resample (distance in m) the routes
+    if simplify_tolerance and resample_distance:
+        raise ValueError("Use either --simplify-tolerance or --resample-distance")
+
+    raw_routes = sorted(
+        file_name.removesuffix("-raw.csv")
+        for file_name in os.listdir(raw_dir)
+        if file_name.endswith("-raw.csv")
+    )
+    unknown_routes = set(routes or []) - set(raw_routes)
+    if unknown_routes:
+        raise ValueError(f"Unknown routes: {sorted(unknown_routes)}")
+
+    raw_files = [
+        os.path.join(raw_dir, f"{route}-raw.csv")
+        for route in raw_routes
+        if not routes or route in routes
+    ]
+    os.makedirs(output_dir, exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                clean_route,
+                raw_file_path,
+                output_dir,
+                chunk_size,
+                max_step_km,
+                simplify_tolerance,
+                resample_distance,
+            )
+            for raw_file_path in raw_files
+        ]
+        for future in futures:
+            metadata = future.result()
+            dropped = metadata["dropped"]
+            print(
+                f"{metadata['route']}: {metadata['point_count']} points, "
+                f"{metadata['length_km']} km, dropped "
+                f"{dropped.get('duplicates', 0)} duplicates and "
+                f"{dropped.get('outliers', 0)} outliers"
+            )
+            if dropped.get("gaps"):
+                print(
+                    f"Warning: {metadata['route']} jumps more than {max_step_km} km "
+                    f"{dropped['gaps']} time(s), check the raw route for gaps"
+                )
+
+
+if __name__ == "__main__":
+    # Only needed by the CLI, keep it out of the workers' import path
+    import typer
+
+    typer.run(main)
@@ -0,0 +1,70 @@
+from array import array
+import csv
+from functools import lru_cache
+import json
+import os
+import random
+import sys
+
+CLEAN_ROUTES_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "coordinates/clean-routes"
+)
+
+
+def get_route_path(route: str, extension: str = ".csv") -> str:
+    return os.path.join(CLEAN_ROUTES_PATH, route + "-clean" + extension)
+
+
+def available_routes() -> list:
+    """Names of the routes found in the clean routes directory."""
+    return sorted(
+        file_name.removesuffix("-clean.csv")
+        for file_name in os.listdir(CLEAN_ROUTES_PATH)
+        if file_name.endswith("-clean.csv")
+    )
+
+
+def choose_routes(count: int, route_weights: dict = None, rng=random) -> list:
+    """
+    Route of each of `count` vehicles, drawn by weight. Every clean route is
+    equally likely when no weights are given.
+    """
+    route_weights = route_weights or dict.fromkeys(available_routes(), 1)
+    return rng.choices(list(route_weights), list(route_weights.values()), k=count)
+
+
+@lru_cache(maxsize=None)
+def load_route(route: str) -> tuple:
+    """
+    Read a clean route once per process and keep it in memory.
+
+    The route is returned as an immutable tuple of (lat, lon) pairs so it can be
+    shared by every GPS on the same route. When the cache is filled before
+    forking, workers inherit it copy-on-write instead of parsing the CSV again.
+    The binary form written by `clean_routes` is preferred, it loads much faster.
+    """
+    binary_path = get_route_path(route, ".bin")
+    if os.path.exists(binary_path):
+        coords = array("d")
+        with open(binary_path, "rb") as file:
+            coords.frombytes(file.read())
+        if sys.byteorder == "big":
+            coords.byteswap()
+        return tuple(zip(coords[::2], coords[1::2]))
+
+    with open(get_route_path(route), newline="") as file:
+        reader = csv.reader(file)
+        next(reader)  # Skip the lat,lon header
+        return tuple((float(lat), float(lon)) for lat, lon in reader)
+
+
+def load_route_metadata(route: str) -> dict:
+    """Length, bounding box and point count of a route, see `clean_routes`."""
+    with open(get_route_path(route, ".json")) as file:
+        return json.load(file)
+
+
+def preload_routes(routes: list = None) -> None:
+    """Load the given routes (all of them by default) into the route cache."""
+    for route in routes if routes is not None else available_routes():
+        load_route(route)
@@ -1,10 +1,9 @@
 from abc import ABC, abstractmethod
 import math
-from uuid import uuid4
-from random import random, uniform
+from uuid import UUID
+from random import getrandbits, random, uniform
 import time
-import pandas as pd
-import os
+from mqtt_vehicle_fleet_sensor_data.iot.routes import get_route_path, load_route
 
 
 class Sensor(ABC):
@@ -54,8 +53,6 @@ class O2Sensor:
         # - Stoichiometric (AFR ≈ 14.7): Mid-range voltage output (~0.45 volts)
         # - Rich mixture (AFR < 14.7): Higher voltage output (0.45 - 0.9 volts)
 
-        print(air_fuel_ratio)
-
         if air_fuel_ratio > 14.7:
             # Lean mixture
             self.voltage = 0.1 + (
@@ -170,38 +167,42 @@ class VoltageDivider:
         self.V_ref = 5  # Reference voltage from ECU in volts
         self.R_pull_up = 10000  # Pull-up resistor value in ohms
 
-    def get_voltage(self, temperature: float = uniform(10.0, 40.0)):
+    def get_voltage(self, temperature: float = None):
+        # Drawn on every call, a default argument would be drawn once at import
+        if temperature is None:
+            temperature = uniform(10.0, 40.0)
         resistance = self.thermistor.get_resistance(temperature)
         V = self.V_ref * (resistance / (resistance + self.R_pull_up))
         return V
 
 
 class GPS:
-    def __init__(self, route: str) -> None:
-        self.id = str(uuid4())
-        self.file_path = os.path.join(
-            os.path.dirname(os.path.abspath(__file__)),
-            "coordinates/clean-routes",
-            route + "-clean.csv",
-        )
-        self.coords = pd.read_csv(self.file_path)
+    def __init__(self, route: str, clock=time.time) -> None:
+        # Drawn from `random` so seeded simulations get the same ids
+        self.id = str(UUID(int=getrandbits(128), version=4))
+        # Source of the timestamps, simulations replace it with simulated time
+        self.clock = clock
+        self.file_path = get_route_path(route)
+        # Shared, read-only coordinates; each GPS only keeps its own position
+        self.coords = load_route(route)
+        self.position = 0
         self.last_coords = None
 
     def read(self) -> dict:
-        self.last_coords = self.coords.iloc[0]
+        self.last_coords = self.coords[self.position]
 
         self.drive_forward()
 
         return {
             "id": self.id,
-            "timestamp": time.time(),
-            "lat": self.last_coords.values[0].item(),
-            "lon": self.last_coords.values[1].item(),
+            "timestamp": self.clock(),
+            "lat": self.last_coords[0],
+            "lon": self.last_coords[1],
         }
 
     def drive_forward(self):
-        self.coords.drop([self.coords.index[0]], inplace=True)
-        self.coords = pd.concat([self.coords, self.last_coords.to_frame().T])
+        # Loop back to the start of the route once the end is reached
+        self.position = (self.position + 1) % len(self.coords)
 
 
 if __name__ == "__main__":
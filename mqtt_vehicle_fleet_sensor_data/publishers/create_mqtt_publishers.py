@@ -1,10 +1,20 @@
 from concurrent.futures import ProcessPoolExecutor
 from enum import Enum
+import multiprocessing
 from multiprocessing import active_children, current_process
+from random import Random
 import sys
 
+from mqtt_vehicle_fleet_sensor_data.brokers import BrokerPool
+from mqtt_vehicle_fleet_sensor_data.iot.routes import (
+    available_routes,
+    choose_routes,
+    preload_routes,
+)
 from mqtt_vehicle_fleet_sensor_data.publishers.vehicles import Truck, Van
-import typer
+
+# Modules the forkserver imports once so workers start with them already loaded
+FORKSERVER_PRELOAD = ["mqtt_vehicle_fleet_sensor_data.publishers.preload"]
 
 
 class VehicleType(Enum):
@@ -12,16 +22,63 @@ class VehicleType(Enum):
     TRUCK = "truck"
 
 
-def start_vehicle(id: str, vehicle_type: VehicleType, route: str) -> None:
+class StartMethod(str, Enum):
+    FORK = "fork"
+    FORKSERVER = "forkserver"
+    SPAWN = "spawn"
+
+
+def build_vehicle(
+    id: str, vehicle_type: VehicleType, route: str, broker_pool: BrokerPool = None
+):
+    if vehicle_type == VehicleType.VAN:
+        return Van(id, route, broker_pool)
+    elif vehicle_type == VehicleType.TRUCK:
+        return Truck(id, route, broker_pool)
+
+
+def start_vehicle(
+    id: str, vehicle_type: VehicleType, route: str, broker_pool: BrokerPool = None
+) -> None:
     try:
-        if vehicle_type == VehicleType.VAN:
-            Van(id, route).run()
-        elif vehicle_type == VehicleType.TRUCK:
-            Truck(id, route).run()
+        build_vehicle(id, vehicle_type, route, broker_pool).run()
     except KeyboardInterrupt:
         print(f"Worker {current_process().name} interrupted")
 
 
+def create_executor(
+    max_workers: int,
+    start_method: StartMethod = None,
+    routes: list = None,
+    initializer=None,
+    initargs: tuple = (),
+) -> ProcessPoolExecutor:
+    """
+    Create the pool that runs one vehicle per worker process.
+
+    With `fork` the routes are loaded in this process before the pool exists, so
+    workers inherit them copy-on-write. With `forkserver` the server process
+    preloads modules and routes once and every worker is forked from it.
+    """
+    if start_method is None:
+        return ProcessPoolExecutor(
+            max_workers=max_workers, initializer=initializer, initargs=initargs
+        )
+
+    mp_context = multiprocessing.get_context(start_method.value)
+    if start_method == StartMethod.FORK:
+        preload_routes(routes)
+    elif start_method == StartMethod.FORKSERVER:
+        mp_context.set_forkserver_preload(FORKSERVER_PRELOAD)
+
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=mp_context,
+        initializer=initializer,
+        initargs=initargs,
+    )
+
+
 def terminate_active_children():
     for p in active_children():
         print(f"Terminating child process {p.pid}")
@@ -38,21 +95,38 @@ def cleanup(executor):
     print("ACTIVE CHILDRENS:\n", active_children())
 
 
-def main(van_number: int = 0, truck_number: int = 0):
+def main(
+    van_number: int = 0,
+    truck_number: int = 0,
+    routes: list[str] = None,
+    seed: int = None,
+    start_method: StartMethod = None,
+    broker_pool: str = None,
+):
+    # The broker pool file maps each logical broker to its endpoints, vehicles
+    # are spread over them by consistent hashing of their id
+    broker_pool = BrokerPool.from_file(broker_pool) if broker_pool else BrokerPool()
+    # Each vehicle drives a route drawn from `routes` (every clean route by
+    # default), the same seed assigns the same routes
+    unknown_routes = set(routes or []) - set(available_routes())
+    if unknown_routes:
+        raise ValueError(f"Unknown routes: {sorted(unknown_routes)}")
+    vehicles = [(f"van-{i}", VehicleType.VAN) for i in range(1, van_number + 1)] + [
+        (f"truck-{i}", VehicleType.TRUCK) for i in range(1, truck_number + 1)
+    ]
+    vehicle_routes = choose_routes(
+        len(vehicles), dict.fromkeys(routes, 1) if routes else None, Random(seed)
+    )
+    # Vehicles publish forever, so each one needs its own worker
+    max_workers = max(len(vehicles), 1)
+
     try:
-        with ProcessPoolExecutor() as executor:
-            # TODO automate routes probabilistically
+        with create_executor(
+            max_workers, start_method, sorted(set(vehicle_routes))
+        ) as executor:
             [
-                executor.submit(
-                    start_vehicle, f"van-{i}", VehicleType.VAN, "dublin-limerick"
-                )
-                for i in range(1, van_number + 1)
-            ]
-            [
-                executor.submit(
-                    start_vehicle, f"truck-{i}", VehicleType.TRUCK, "dublin-limerick"
-                )
-                for i in range(1, truck_number + 1)
+                executor.submit(start_vehicle, id, vehicle_type, route, broker_pool)
+                for (id, vehicle_type), route in zip(vehicles, vehicle_routes)
             ]
     except KeyboardInterrupt:
         cleanup(executor)
@@ -60,4 +134,7 @@ def main(van_number: int = 0, truck_number: int = 0):
 
 
 if __name__ == "__main__":
+    # Only needed by the CLI, keep it out of the workers' import path
+    import typer
+
     typer.run(main)
@@ -0,0 +1,215 @@
+import csv
+from datetime import datetime, timezone
+from enum import Enum
+import os
+import random
+import sys
+import time
+
+from mqtt_vehicle_fleet_sensor_data.publishers.create_mqtt_publishers import (
+    StartMethod,
+    VehicleType,
+    build_vehicle,
+    cleanup,
+    create_executor,
+)
+from mqtt_vehicle_fleet_sensor_data.utils import flatten
+
+SECONDS_PER_DAY = 24 * 3600
+
+
+class FileFormat(str, Enum):
+    CSV = "csv"
+    PARQUET = "parquet"
+
+
+class SimulatedClock:
+    """Clock for the GPS timestamps that only moves when the simulation ticks."""
+
+    def __init__(self, start: float) -> None:
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class ChunkWriter:
+    """
+    Buffers the records of one vehicle type and writes them in chunks, so memory
+    stays bounded however long the simulation is. Files are partitioned as
+    `vehicle_type=<type>/date=<YYYY-MM-DD>/shard-<shard>-part-<n>.<format>`.
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        vehicle_type: VehicleType,
+        shard: int,
+        file_format: FileFormat,
+        chunk_size: int,
+    ) -> None:
+        self.output_dir = os.path.join(output_dir, f"vehicle_type={vehicle_type.value}")
+        self.shard = shard
+        self.file_format = file_format
+        self.chunk_size = chunk_size
+        self.records = []
+        self.date = None
+        self.date_start = float("-inf")
+        self.part = 0
+
+        if file_format == FileFormat.PARQUET:
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError as exc:
+                raise ImportError(
+                    "Writing Parquet files requires pyarrow: poetry install -E parquet"
+                ) from exc
+            self._pyarrow = pyarrow
+            self._parquet = pyarrow.parquet
+
+    def write(self, record: dict) -> None:
+        timestamp = record["gps.timestamp"]
+        if not self.date_start <= timestamp < self.date_start + SECONDS_PER_DAY:
+            # A chunk never spans two date partitions
+            self.flush()
+            self.date = datetime.fromtimestamp(timestamp, timezone.utc).date()
+            self.date_start = timestamp - timestamp % SECONDS_PER_DAY
+
+        self.records.append(record)
+        if len(self.records) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.records:
+            return
+
+        partition_dir = os.path.join(self.output_dir, f"date={self.date.isoformat()}")
+        os.makedirs(partition_dir, exist_ok=True)
+        file_path = os.path.join(
+            partition_dir,
+            f"shard-{self.shard:03d}-part-{self.part:05d}.{self.file_format.value}",
+        )
+
+        if self.file_format == FileFormat.CSV:
+            with open(file_path, "w", newline="") as file:
+                # Records of a vehicle type share their keys and key order
+                writer = csv.writer(file)
+                writer.writerow(self.records[0].keys())
+                writer.writerows(record.values() for record in self.records)
+        else:
+            table = self._pyarrow.Table.from_pylist(self.records)
+            self._parquet.write_table(table, file_path)
+
+        self.records = []
+        self.part += 1
+
+
+def generate_shard(
+    shard: int,
+    vehicles: list,
+    start: float,
+    ticks: int,
+    interval: float,
+    output_dir: str,
+    file_format: FileFormat,
+    chunk_size: int,
+    seed: int,
+) -> int:
+    """
+    Run a group of vehicles in simulated time and write their `fleet/data`
+    payloads to files. Returns the number of records written.
+
+    Args:
+        vehicles (list): (id, vehicle type, route) of each vehicle in the shard.
+    """
+    # Sensor readings come from `random`, seeding it per shard makes the
+    # output reproducible for the same seed and number of workers
+    random.seed(f"{seed}:{shard}")
+
+    clock = SimulatedClock(start)
+    fleet = []
+    for id, vehicle_type, route in vehicles:
+        vehicle = build_vehicle(id, vehicle_type, route)
+        vehicle.gps.clock = clock
+        fleet.append((vehicle, vehicle_type))
+
+    writers = {
+        vehicle_type: ChunkWriter(
+            output_dir, vehicle_type, shard, file_format, chunk_size
+        )
+        for vehicle_type in {vehicle_type for _, vehicle_type in fleet}
+    }
+
+    for tick in range(ticks):
+        clock.now = start + tick * interval
+        for vehicle, vehicle_type in fleet:
+            writers[vehicle_type].write(flatten(vehicle.collect_data()["data"]["msg"]))
+
+    for writer in writers.values():
+        writer.flush()
+
+    return ticks * len(fleet)
+
+
+def main(
+    van_number: int = 0,
+    truck_number: int = 0,
+    route: str = "dublin-limerick",
+    hours: float = 24.0,
+    interval: float = 1.0,
+    start: datetime = None,
+    output_dir: str = "telemetry",
+    file_format: FileFormat = FileFormat.CSV,
+    chunk_size: int = 100_000,
+    workers: int = None,
+    seed: int = 0,
+    start_method: StartMethod = None,
+):
+    # Same vehicle models as the live publishers, but ticking every `interval`
+    # simulated seconds as fast as possible instead of publishing to brokers
+    start = (start or datetime(2024, 1, 1)).replace(tzinfo=timezone.utc).timestamp()
+    ticks = int(hours * 3600 / interval)
+    workers = workers or os.cpu_count()
+
+    vehicles = [
+        (f"van-{i}", VehicleType.VAN, route) for i in range(1, van_number + 1)
+    ] + [(f"truck-{i}", VehicleType.TRUCK, route) for i in range(1, truck_number + 1)]
+    shards = [vehicles[shard::workers] for shard in range(workers)]
+    shards = [shard_vehicles for shard_vehicles in shards if shard_vehicles]
+
+    started = time.perf_counter()
+    try:
+        with create_executor(len(shards) or 1, start_method, [route]) as executor:
+            futures = [
+                executor.submit(
+                    generate_shard,
+                    shard,
+                    shard_vehicles,
+                    start,
+                    ticks,
+                    interval,
+                    output_dir,
+                    file_format,
+                    chunk_size,
+                    seed,
+                )
+                for shard, shard_vehicles in enumerate(shards)
+            ]
+            records = sum(future.result() for future in futures)
+    except KeyboardInterrupt:
+        cleanup(executor)
+        sys.exit()
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"{records} records written to {output_dir} in {elapsed:.1f}s "
+        f"({records / elapsed:.0f} records/s)"
+    )
+
+
+if __name__ == "__main__":
+    # Only needed by the CLI, keep it out of the workers' import path
+    import typer
+
+    typer.run(main)
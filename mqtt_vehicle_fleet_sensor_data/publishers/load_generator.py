@@ -0,0 +1,404 @@
+from functools import partial
+import math
+import multiprocessing
+from multiprocessing import current_process
+import os
+import random
+from string import Formatter
+import sys
+import threading
+import time
+import tomllib
+
+from mqtt_vehicle_fleet_sensor_data.brokers import BrokerPool
+from mqtt_vehicle_fleet_sensor_data.iot.routes import available_routes, choose_routes
+from mqtt_vehicle_fleet_sensor_data.publishers.create_mqtt_publishers import (
+    StartMethod,
+    VehicleType,
+    build_vehicle,
+    cleanup,
+    create_executor,
+    terminate_active_children,
+)
+
+RAMP_CURVES = {
+    "linear": lambda x: x,
+    "exponential": lambda x: (2 ** (10 * x) - 1) / 1023,
+    "sine": lambda x: (1 - math.cos(math.pi * x)) / 2,
+}
+
+SCENARIO_KEYS = {"target_rate", "seed", "vehicles", "routes", "topics", "ramp"}
+VEHICLES_KEYS = {"max", "van", "truck"}
+RAMP_KEYS = {"up", "hold", "down", "curve", "max_rate_scale"}
+
+# How often workers exchange rate scale and published count with the controller
+SYNC_INTERVAL = 0.1
+MIN_RATE_SCALE = 0.05
+MIN_EFFICIENCY = 0.05
+# Smoothing of the measured publish efficiency, closer to 1 reacts faster
+EFFICIENCY_SMOOTHING = 0.5
+# The fleet is considered saturated when it stays below this fraction of the
+# target rate for this many consecutive control intervals
+SATURATION_THRESHOLD = 0.9
+SATURATION_INTERVALS = 5
+
+
+def _check_keys(section: str, config: dict, known: set) -> None:
+    # Misspelt keys would silently fall back to their defaults
+    unknown = set(config) - known
+    if unknown:
+        raise ValueError(
+            f"Unknown keys in {section}: {sorted(unknown)}, use {sorted(known)}"
+        )
+
+
+def _check_number(name: str, value, allow_zero: bool = False) -> None:
+    # TOML accepts strings, booleans, nan and inf wherever a number is expected
+    if (
+        isinstance(value, bool)
+        or not isinstance(value, (int, float))
+        or not math.isfinite(value)
+        or value < 0
+        or (value == 0 and not allow_zero)
+    ):
+        expected = "0 or above" if allow_zero else "above 0"
+        raise ValueError(f"{name} must be {expected}, got {value!r}")
+
+
+class Scenario:
+    """
+    Declarative load test loaded from a TOML file:
+
+        target_rate = 500           # Fleet-wide msgs/s
+        seed = 0
+
+        [vehicles]
+        max = 200                   # Most vehicles the controller can activate
+        van = 0.7                   # Vehicle mix
+        truck = 0.3
+
+        [routes]                    # Route weights, all clean routes if empty
+        dublin-cork = 2
+        dublin-limerick = 1
+
+        [topics]                    # msgs/s per vehicle, 1 if not listed
+        "fleet/gps" = 2
+        "fleet/{id}/ecu" = 0.5
+
+        [ramp]                      # Seconds, curves: linear, exponential, sine
+        up = 60
+        hold = 300
+        down = 60
+        curve = "linear"
+        max_rate_scale = 10         # Most the topic rates can be sped up
+    """
+
+    def __init__(self, config: dict) -> None:
+        vehicles = config.get("vehicles", {})
+        ramp = config.get("ramp", {})
+        _check_keys("scenario", config, SCENARIO_KEYS)
+        _check_keys("[vehicles]", vehicles, VEHICLES_KEYS)
+        _check_keys("[ramp]", ramp, RAMP_KEYS)
+
+        if "target_rate" not in config:
+            raise ValueError("Scenario needs a target_rate")
+        self.target_rate = config["target_rate"]
+        self.seed = config.get("seed", 0)
+        self.max_vehicles = vehicles.get("max", 100)
+        # Vans only by default, a mix naming any vehicle type only has those
+        if {"van", "truck"} & set(vehicles):
+            self.vehicle_mix = {
+                VehicleType.VAN: vehicles.get("van", 0.0),
+                VehicleType.TRUCK: vehicles.get("truck", 0.0),
+            }
+        else:
+            self.vehicle_mix = {VehicleType.VAN: 1.0, VehicleType.TRUCK: 0.0}
+        self.route_weights = config.get("routes") or dict.fromkeys(
+            available_routes(), 1
+        )
+        self.topic_rates = config.get("topics", {})
+        self.ramp_up = ramp.get("up", 0)
+        self.hold = ramp.get("hold", 60)
+        self.ramp_down = ramp.get("down", 0)
+        self.max_rate_scale = ramp.get("max_rate_scale", 10.0)
+
+        _check_number("target_rate", self.target_rate)
+        if not isinstance(self.seed, int):
+            raise ValueError(f"seed must be an integer, got {self.seed!r}")
+        if not isinstance(self.max_vehicles, int) or self.max_vehicles < 1:
+            raise ValueError(
+                f"vehicles.max must be at least 1, got {self.max_vehicles!r}"
+            )
+        for vehicle_type, weight in self.vehicle_mix.items():
+            _check_number(f"vehicles.{vehicle_type.value}", weight, allow_zero=True)
+        if not any(self.vehicle_mix.values()):
+            raise ValueError("The [vehicles] mix needs a van or truck weight above 0")
+        for route, weight in self.route_weights.items():
+            _check_number(f"Weight of route '{route}'", weight, allow_zero=True)
+        if not any(self.route_weights.values()):
+            raise ValueError("The [routes] weights need a route weight above 0")
+        for name in ("up", "hold", "down"):
+            _check_number(f"ramp.{name}", ramp.get(name, 0), allow_zero=True)
+        _check_number("ramp.max_rate_scale", self.max_rate_scale)
+        for topic, rate in self.topic_rates.items():
+            _check_number(f"Rate of topic '{topic}'", rate)
+            placeholders = {field for _, field, _, _ in Formatter().parse(topic)}
+            if placeholders - {None, "id"}:
+                raise ValueError(f"Topic '{topic}' can only use the {{id}} placeholder")
+
+        unknown_routes = set(self.route_weights) - set(available_routes())
+        if unknown_routes:
+            raise ValueError(f"Unknown routes in scenario: {sorted(unknown_routes)}")
+        if ramp.get("curve", "linear") not in RAMP_CURVES:
+            raise ValueError(
+                f"Unknown ramp curve '{ramp['curve']}', use one of {list(RAMP_CURVES)}"
+            )
+        self.curve = RAMP_CURVES[ramp.get("curve", "linear")]
+
+    @classmethod
+    def from_file(cls, file_path: str) -> "Scenario":
+        with open(file_path, "rb") as file:
+            return cls(tomllib.load(file))
+
+    @property
+    def duration(self) -> float:
+        return self.ramp_up + self.hold + self.ramp_down
+
+    def target_at(self, elapsed: float) -> float:
+        """Fleet-wide target rate `elapsed` seconds into the scenario."""
+        if elapsed < self.ramp_up:
+            return self.target_rate * self.curve(elapsed / self.ramp_up)
+        if elapsed < self.ramp_up + self.hold:
+            return self.target_rate
+        if elapsed < self.duration:
+            remaining = self.duration - elapsed
+            return self.target_rate * self.curve(remaining / self.ramp_down)
+        return 0.0
+
+    def build_fleet(self) -> list:
+        """(id, vehicle type, route) of every vehicle, in activation order."""
+        rng = random.Random(self.seed)
+        vehicle_types = rng.choices(
+            list(self.vehicle_mix), list(self.vehicle_mix.values()), k=self.max_vehicles
+        )
+        routes = choose_routes(self.max_vehicles, self.route_weights, rng)
+
+        fleet = []
+        numbers = dict.fromkeys(VehicleType, 0)
+        for vehicle_type, route in zip(vehicle_types, routes):
+            numbers[vehicle_type] += 1
+            id = f"{vehicle_type.value}-{numbers[vehicle_type]}"
+            fleet.append((id, vehicle_type, route))
+        return fleet
+
+
+# Shared with the controller, set in every worker by `_init_worker`
+_rate_scales = None
+_published_counts = None
+_nominal_rates = None
+
+
+def _init_worker(rate_scales, published_counts, nominal_rates) -> None:
+    global _rate_scales, _published_counts, _nominal_rates
+    _rate_scales = rate_scales
+    _published_counts = published_counts
+    _nominal_rates = nominal_rates
+
+
+def _sync_with_controller(tcu, index: int) -> None:
+    while True:
+        tcu.rate_scale = _rate_scales[index]
+        _published_counts[index] = tcu.published_count
+        time.sleep(SYNC_INTERVAL)
+
+
+def run_vehicle(
+    index: int,
+    id: str,
+    vehicle_type: VehicleType,
+    route: str,
+    broker_pool: BrokerPool,
+    topic_rates: dict,
+) -> None:
+    try:
+        vehicle = build_vehicle(id, vehicle_type, route, broker_pool)
+        tcu = vehicle.tcu
+        tcu.topic_rates = {
+            topic.format(id=id): rate for topic, rate in topic_rates.items()
+        }
+        tcu.verbose = False
+        tcu.rate_scale = _rate_scales[index]
+
+        # Messages per second the vehicle publishes at a rate scale of 1, the
+        # controller only activates vehicles once they have reported it
+        _nominal_rates[index] = sum(
+            tcu.topic_rates.get(event["mqtt_topic"], 1.0)
+            for event in vehicle.collect_data().values()
+        )
+
+        threading.Thread(
+            target=_sync_with_controller, args=(tcu, index), daemon=True
+        ).start()
+        vehicle.run()
+    except KeyboardInterrupt:
+        print(f"Worker {current_process().name} interrupted")
+
+
+class RateController:
+    """
+    Holds the fleet-wide publish rate at the target by choosing how many
+    vehicles are active and scaling the topic rates of the active ones.
+    """
+
+    def __init__(self, rate_scales, nominal_rates, max_rate_scale: float) -> None:
+        self.rate_scales = rate_scales
+        self.nominal_rates = nominal_rates
+        self.max_rate_scale = max_rate_scale
+        self.active = 0
+        self.scale = 1.0
+        # Achieved rate over the rate the active vehicles should publish
+        self.efficiency = 1.0
+        self.expected_rate = 0.0
+        self.previous_target = 0.0
+        self.intervals_below_target = 0
+
+    def update(self, target: float, achieved: float) -> None:
+        if self.expected_rate > 0:
+            self.efficiency += EFFICIENCY_SMOOTHING * (
+                max(achieved / self.expected_rate, MIN_EFFICIENCY) - self.efficiency
+            )
+
+        # The achieved rate was measured while the previous target applied
+        if achieved < SATURATION_THRESHOLD * self.previous_target:
+            self.intervals_below_target += 1
+        else:
+            self.intervals_below_target = 0
+
+        # Activate ready vehicles in order until their nominal rate covers the
+        # target, then scale their topic rates to make up for the efficiency
+        nominal_rate = 0.0
+        active = []
+        for index, rate in enumerate(self.nominal_rates):
+            if nominal_rate >= target:
+                break
+            if rate > 0:
+                nominal_rate += rate
+                active.append(index)
+
+        if nominal_rate > 0:
+            self.scale = min(
+                max(target / (nominal_rate * self.efficiency), MIN_RATE_SCALE),
+                self.max_rate_scale,
+            )
+
+        active = set(active)
+        for index in range(len(self.rate_scales)):
+            self.rate_scales[index] = self.scale if index in active else 0.0
+        self.active = len(active)
+        self.expected_rate = nominal_rate * self.scale
+        self.previous_target = target
+
+    def saturation(self) -> str:
+        """Why the target rate is not being reached, empty if it is."""
+        if self.intervals_below_target < SATURATION_INTERVALS:
+            return ""
+
+        if not any(self.nominal_rates):
+            return "no vehicle is running, check the vehicle errors above"
+        load, cpus = os.getloadavg()[0], os.cpu_count()
+        if load >= cpus:
+            return f"local machine saturated (load average {load:.1f} on {cpus} CPUs)"
+        if self.scale >= self.max_rate_scale:
+            return "fleet at its maximum rate, raise vehicles.max or max_rate_scale"
+        return "brokers or network not keeping up"
+
+
+def main(
+    scenario: str,
+    broker_pool: str = None,
+    start_method: StartMethod = None,
+    interval: float = 1.0,
+):
+    # Runs the scenario file, reporting every `interval` seconds
+    scenario = Scenario.from_file(scenario)
+    broker_pool = BrokerPool.from_file(broker_pool) if broker_pool else BrokerPool()
+    fleet = scenario.build_fleet()
+
+    # Each worker only writes its own slot, so no locks are needed
+    rate_scales = multiprocessing.RawArray("d", len(fleet))
+    published_counts = multiprocessing.RawArray("Q", len(fleet))
+    nominal_rates = multiprocessing.RawArray("d", len(fleet))
+    controller = RateController(rate_scales, nominal_rates, scenario.max_rate_scale)
+    finished = threading.Event()
+
+    def report_stopped_vehicle(index: int, id: str, future) -> None:
+        # Vehicles publish until the scenario finishes, one that stops earlier
+        # has failed. Zeroing its nominal rate keeps the controller from using it
+        if finished.is_set():
+            return
+        nominal_rates[index] = 0.0
+        exc = None if future.cancelled() else future.exception()
+        print(f"Vehicle {id} stopped" + (f": {exc!r}" if exc else ""))
+
+    executor = create_executor(
+        len(fleet),
+        start_method,
+        list(scenario.route_weights),
+        initializer=_init_worker,
+        initargs=(rate_scales, published_counts, nominal_rates),
+    )
+    try:
+        for index, (id, vehicle_type, route) in enumerate(fleet):
+            future = executor.submit(
+                run_vehicle,
+                index,
+                id,
+                vehicle_type,
+                route,
+                broker_pool,
+                scenario.topic_rates,
+            )
+            future.add_done_callback(partial(report_stopped_vehicle, index, id))
+
+        started = last_report = time.monotonic()
+        last_count = 0
+        while time.monotonic() - started < scenario.duration:
+            time.sleep(interval)
+
+            now = time.monotonic()
+            count = sum(published_counts)
+            achieved = (count - last_count) / (now - last_report)
+            last_count, last_report = count, now
+
+            target = scenario.target_at(now - started)
+            controller.update(target, achieved)
+
+            saturation = controller.saturation()
+            print(
+                f"{now - started:7.1f}s target {target:9.1f} msgs/s "
+                f"achieved {achieved:9.1f} msgs/s "
+                f"vehicles {controller.active:5d} scale {controller.scale:5.2f}"
+                + (f" SATURATED: {saturation}" if saturation else "")
+            )
+
+        finished.set()
+        print(f"Scenario finished, {sum(published_counts)} messages published")
+
+    except KeyboardInterrupt:
+        finished.set()
+        cleanup(executor)
+        sys.exit()
+
+    finally:
+        # Vehicles publish forever, stop them instead of waiting, also when the
+        # controller fails
+        finished.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+        terminate_active_children()
+
+
+if __name__ == "__main__":
+    # Only needed by the CLI, keep it out of the workers' import path
+    import typer
+
+    typer.run(main)
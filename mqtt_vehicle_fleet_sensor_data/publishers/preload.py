@@ -0,0 +1,9 @@
+"""
+Imported once by the forkserver process so that vehicle workers are forked with
+the publisher modules and every clean route already in memory.
+"""
+
+from mqtt_vehicle_fleet_sensor_data.iot.routes import preload_routes
+from mqtt_vehicle_fleet_sensor_data.publishers import vehicles  # noqa: F401
+
+preload_routes()
@@ -1,13 +1,28 @@
 import json
+import math
 import threading
 import time
 import paho.mqtt.client as mqtt
 
+# How often a paused TCU checks whether it has been resumed, in seconds
+PAUSED_POLL_INTERVAL = 0.1
+# The vehicle moves and its sensors are read once per interval, in seconds,
+# whatever the topic rates. Faster topics republish the latest readings, so a
+# load test changes the message rate but not how the vehicle drives
+READING_INTERVAL = 1.0
+
 
 class TelematicConstrolUnit:
-    def __init__(self, brokers: list, collect_data) -> None:
+    def __init__(self, brokers: list, collect_data, topic_rates: dict = None) -> None:
         self.mqtt_brokers = brokers
         self._collect_data = collect_data
+        # Messages per second of each topic, topics not listed publish once a second
+        self.topic_rates = topic_rates or {}
+        # Multiplies every topic rate, 0 pauses publishing
+        self.rate_scale = 1.0
+        self.published_count = 0
+        # Print every published message, too slow for load tests
+        self.verbose = True
         self.clients = {}
         self.message_store = {}
         self.clients_connected = False
@@ -24,8 +39,26 @@ class TelematicConstrolUnit:
         while not self.clients_connected:
             time.sleep(0.1)
 
+        # When each topic was last published, the interval between publications
+        # is recomputed every tick so rate changes apply straight away
+        last_publish = {}
+        last_reading = -math.inf
+
         while True:
-            for event in self._collect_data().values():
+            if self.rate_scale <= 0:
+                time.sleep(PAUSED_POLL_INTERVAL)
+                continue
+
+            now = time.monotonic()
+            if now - last_reading >= READING_INTERVAL:
+                events = self._collect_data()
+                last_reading = now
+
+            for event in events.values():
+                if now < self._next_publish(event["mqtt_topic"], last_publish):
+                    continue
+                last_publish[event["mqtt_topic"]] = now
+
                 # Get client already connected to the broker
                 mqttc = self.clients[event["mqtt_broker"]]
 
@@ -45,7 +78,19 @@ class TelematicConstrolUnit:
 
                 self._publish_event.wait()
 
-            time.sleep(1)
+            # Sleep until the next topic or reading is due, so the vehicle keeps
+            # moving and rate changes are picked up
+            next_tick = min(
+                last_reading + READING_INTERVAL,
+                *(self._next_publish(topic, last_publish) for topic in last_publish),
+            )
+            time.sleep(max(next_tick - time.monotonic(), 0))
+
+    def _next_publish(self, topic: str, last_publish: dict) -> float:
+        if topic not in last_publish or self.rate_scale <= 0:
+            return 0.0  # Due straight away
+        rate = self.topic_rates.get(topic, 1.0) * self.rate_scale
+        return last_publish[topic] + 1 / rate
 
     def _on_connect(self, client, userdata, flags, reason_code, properties):
         # The callback for when the client receives a CONNACK response from the server
@@ -58,11 +103,13 @@ class TelematicConstrolUnit:
     def _on_publish(self, client, userdata, mid, reason_code, properties):
         published_message = self.message_store.pop(mid, None)
 
-        if published_message:
-            print(f"mid {mid}: {published_message}")
-        else:
-            print(f"mid {mid} not found")
+        if self.verbose:
+            if published_message:
+                print(f"mid {mid}: {published_message}")
+            else:
+                print(f"mid {mid} not found")
 
+        self.published_count += 1
         self._publish_event.set()
 
     def _create_client(self) -> None:
@@ -40,6 +40,10 @@ class PIDController:
         return output
 
 
+# Readings reported by the ECU, in the order of its payload
+ECU_READINGS = ("ect", "iat", "map", "fuel-press", "oxygen", "vss")
+
+
 class EngineControlUnit:
     """Vehicle's ECU. Collects and processes data to be read by the Central Device."""
 
@@ -60,6 +64,9 @@ class EngineControlUnit:
         self.vss_pulses_per_rotation = vss_pulses_per_rotation
         self.vss_wheel_circumference = vss_wheel_circumference
 
+        # Injected faults, reading name to forced value or function of the reading
+        self.faults = {}
+
     def read_data(self, vss_pulse_frequency):
         self._get_vehicle_speed(vss_pulse_frequency)
 
@@ -72,9 +79,27 @@ class EngineControlUnit:
             "vss": self.vehicle_speed,
         }
 
+        for reading, fault in self.faults.items():
+            data[reading] = fault(data[reading]) if callable(fault) else fault
+
         self._adjust_fuel_injection()
         return data
 
+    def inject_fault(self, reading: str, fault) -> None:
+        """
+        Force a faulty reading until `clear_faults` is called, e.g. an overheating
+        engine with `inject_fault("ect", 120.0)` or a drifting O2 sensor with
+        `inject_fault("oxygen", lambda voltage: voltage * 0.2)`.
+        """
+        if reading not in ECU_READINGS:
+            raise ValueError(
+                f"Unknown ECU reading '{reading}', use one of {ECU_READINGS}"
+            )
+        self.faults[reading] = fault
+
+    def clear_faults(self) -> None:
+        self.faults.clear()
+
     def _get_engine_coolant_temperature(self) -> float:
         # TODO Temperature values based on system
         voltage = self.voltage_divider.get_voltage(uniform(10.0, 40.0))
@@ -1,4 +1,4 @@
-from copy import deepcopy
+from mqtt_vehicle_fleet_sensor_data.brokers import BrokerPool
 from mqtt_vehicle_fleet_sensor_data.iot.sensors import VoltageDivider
 from mqtt_vehicle_fleet_sensor_data.publishers.telematic_control_unit import (
     TelematicConstrolUnit,
@@ -7,10 +7,11 @@ from mqtt_vehicle_fleet_sensor_data.publishers.vehicle_base import Vehicle
 
 
 class Van(Vehicle):
-    def __init__(self, id: str, route: str) -> None:
-        # Brokers
-        self.mqtt_broker_fleet = {"name": "fleet", "host": "localhost", "port": 1883}
-        self.mqtt_broker_vans = {"name": "vans", "host": "localhost", "port": 1884}
+    def __init__(self, id: str, route: str, broker_pool: BrokerPool = None) -> None:
+        # Brokers, each logical broker may be sharded across several endpoints
+        broker_pool = broker_pool or BrokerPool()
+        self.mqtt_broker_fleet = broker_pool.get_broker("fleet", id)
+        self.mqtt_broker_vans = broker_pool.get_broker("vans", id)
         # Topics
         self.mqtt_topic_fleet_data = "fleet/data"
         self.mqtt_topic_fleet_gps = "fleet/gps"
@@ -38,8 +39,8 @@ class Van(Vehicle):
         data = super().collect_data()
 
         cargo_temp = self.cargo_temp_sensor.get_voltage()
-        gps = deepcopy(data["gps"])
-        ecu = deepcopy(data["ecu"])
+        gps = dict(data["gps"])
+        ecu = dict(data["ecu"])
 
         data["cargo_temperature"] = cargo_temp
 
@@ -81,9 +82,10 @@ class Van(Vehicle):
 
 
 class Truck(Vehicle):
-    def __init__(self, id: str, route: str) -> None:
-        self.mqtt_broker_fleet = {"name": "fleet", "host": "localhost", "port": 1883}
-        self.mqtt_broker_trucks = {"name": "trucks", "host": "localhost", "port": 1885}
+    def __init__(self, id: str, route: str, broker_pool: BrokerPool = None) -> None:
+        broker_pool = broker_pool or BrokerPool()
+        self.mqtt_broker_fleet = broker_pool.get_broker("fleet", id)
+        self.mqtt_broker_trucks = broker_pool.get_broker("trucks", id)
         self.mqtt_topic_fleet_data = "fleet/data"
         self.mqtt_topic_fleet_gps = "fleet/gps"
         self.mqtt_topic_truck = f"fleet/{id}"
@@ -112,8 +114,8 @@ class Truck(Vehicle):
 
         # cargo_temp = self.cargo_temp_sensor.get_voltage()
         trailer_pressure = self.trailer_pressure_sensor.get_voltage()
-        gps = deepcopy(data["gps"])
-        ecu = deepcopy(data["ecu"])
+        gps = dict(data["gps"])
+        ecu = dict(data["ecu"])
 
         data["trailer_pressure"] = trailer_pressure
 
@@ -0,0 +1,310 @@
+import json
+import math
+import threading
+
+import numpy as np
+
+from mqtt_vehicle_fleet_sensor_data.brokers import BrokerPool
+from mqtt_vehicle_fleet_sensor_data.publishers.vehicle_base import ECU_READINGS
+from mqtt_vehicle_fleet_sensor_data.subscribers.mqtt_subscriber import MQTTSubscriber
+
+ALERTS_TOPIC = "fleet/{id}/alerts"
+
+# Plausible range of each ECU reading, readings outside it raise an alert
+THRESHOLDS = {
+    "ect": (-40.0, 105.0),  # Overheating engine above 105 °C
+    "iat": (-40.0, 80.0),
+    "map": (0.5, 4.5),  # Sensor output range in volts
+    "fuel-press": (0.5, 4.5),
+    "vss": (0.0, 250.0),
+}
+# Largest plausible change per second of each reading
+MAX_RATES = {"vss": 30.0}
+# Rolling statistics are exponentially weighted over about this many readings
+ROLLING_SPAN = 30
+# Readings further than this many rolling standard deviations from the rolling
+# mean raise an alert, once a vehicle has sent enough readings. A shorter warm-up
+# underestimates the variance and raises false alerts on healthy vehicles
+Z_SCORE_LIMIT = 4.0
+WARMUP_READINGS = ROLLING_SPAN
+# The O2 sensor switches between lean and rich, so lean/rich excursions are
+# detected on its rolling mean voltage
+LEAN_OXYGEN_VOLTAGE = 0.3
+RICH_OXYGEN_VOLTAGE = 0.7
+# Readings waiting to be evaluated beyond this many full batches are dropped,
+# the detector is not keeping up with the fleet
+MAX_PENDING_BATCHES = 10
+
+
+class AnomalyDetector:
+    """
+    Evaluates threshold, rate-of-change and rolling z-score rules on ECU
+    readings of the whole fleet at once. Per-vehicle state lives in NumPy arrays
+    indexed by vehicle row, so a batch costs a few array operations whatever the
+    fleet size. Only rules that start failing raise an alert, a vehicle stuck in
+    a fault does not alert on every reading.
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self.rows = {}  # Vehicle id to row
+        self.vehicle_ids = []  # Row to vehicle id
+
+        thresholds = [THRESHOLDS.get(r, (-math.inf, math.inf)) for r in ECU_READINGS]
+        self.lower, self.upper = np.array(thresholds).T
+        self.max_rates = np.array([MAX_RATES.get(r, math.inf) for r in ECU_READINGS])
+        self.alpha = 2 / (ROLLING_SPAN + 1)
+        self.oxygen = ECU_READINGS.index("oxygen")
+
+        # (rule, reading) of every column of the alert flags
+        self.rules = (
+            [("threshold", reading) for reading in ECU_READINGS]
+            + [("rate", reading) for reading in ECU_READINGS]
+            + [("zscore", reading) for reading in ECU_READINGS]
+            + [("lean", "oxygen"), ("rich", "oxygen")]
+        )
+
+        self.last_values = np.full((capacity, len(ECU_READINGS)), math.nan)
+        self.last_timestamps = np.full(capacity, math.nan)
+        self.means = np.zeros((capacity, len(ECU_READINGS)))
+        self.variances = np.zeros((capacity, len(ECU_READINGS)))
+        self.counts = np.zeros(capacity, dtype=np.int64)
+        self.failing = np.zeros((capacity, len(self.rules)), dtype=bool)
+
+    def evaluate(self, vehicle_ids, timestamps, values) -> list:
+        """
+        Evaluate a batch of readings and return the alerts it raises.
+
+        Args:
+            vehicle_ids: Vehicle id of each reading.
+            timestamps: Timestamp of each reading, in seconds.
+            values: ECU readings, one row per reading in `ECU_READINGS` order.
+        """
+        rows = np.fromiter(
+            (self._get_row(vehicle_id) for vehicle_id in vehicle_ids),
+            dtype=np.intp,
+            count=len(vehicle_ids),
+        )
+        timestamps = np.asarray(timestamps, dtype=float)
+        values = np.asarray(values, dtype=float).reshape(len(rows), len(ECU_READINGS))
+        if not len(rows):
+            return []
+
+        # A vehicle may send several readings in one batch. They are evaluated in
+        # order, first every vehicle's first reading, then the second ones...
+        order = np.lexsort((timestamps, rows))
+        sorted_rows = rows[order]
+        group_starts = np.flatnonzero(np.r_[True, sorted_rows[1:] != sorted_rows[:-1]])
+        group_sizes = np.diff(np.r_[group_starts, len(rows)])
+        occurrence = np.arange(len(rows)) - np.repeat(group_starts, group_sizes)
+
+        alerts = []
+        for level in range(group_sizes.max()):
+            index = order[occurrence == level]
+            alerts += self._evaluate_once(rows[index], timestamps[index], values[index])
+        return alerts
+
+    def _evaluate_once(self, rows, timestamps, values) -> list:
+        # Every vehicle appears at most once in `rows`
+        seen = self.counts[rows] > 0
+        warmed_up = self.counts[rows] >= WARMUP_READINGS
+        means = self.means[rows]
+        variances = self.variances[rows]
+        last_values = self.last_values[rows]
+        # A NaN or infinite reading only raises a threshold alert, it would turn
+        # the rolling statistics of the vehicle into NaN for good
+        finite = np.isfinite(values)
+
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            elapsed = (timestamps - self.last_timestamps[rows])[:, None]
+            rates = np.abs(values - last_values) / elapsed
+            stds = np.sqrt(variances)
+            z_scores = np.abs(values - means) / stds
+
+            # Exponentially weighted rolling mean and variance. The first readings
+            # of a vehicle are plainly averaged, otherwise the first one would
+            # dominate
+            weights = np.maximum(self.alpha, 1 / (self.counts[rows] + 1))[:, None]
+            deltas = values - means
+            means = np.where(finite, means + weights * deltas, means)
+            variances = np.where(
+                finite, (1 - weights) * (variances + weights * deltas**2), variances
+            )
+
+        threshold_flags = ~finite | (values < self.lower) | (values > self.upper)
+        rate_flags = finite & seen[:, None] & (elapsed > 0) & (rates > self.max_rates)
+        z_score_flags = (
+            finite & warmed_up[:, None] & (stds > 0) & (z_scores > Z_SCORE_LIMIT)
+        )
+        oxygen_means = means[:, self.oxygen]
+        lean = warmed_up & (oxygen_means < LEAN_OXYGEN_VOLTAGE)
+        rich = warmed_up & (oxygen_means > RICH_OXYGEN_VOLTAGE)
+
+        self.means[rows] = means
+        self.variances[rows] = variances
+        self.last_values[rows] = np.where(finite, values, last_values)
+        self.last_timestamps[rows] = timestamps
+        self.counts[rows] += 1
+
+        flags = np.column_stack(
+            [threshold_flags, rate_flags, z_score_flags, lean, rich]
+        )
+        new_flags = flags & ~self.failing[rows]
+        self.failing[rows] = flags
+
+        return [
+            self._create_alert(rows[i], timestamps[i], values[i], new_flags[i])
+            for i in np.flatnonzero(new_flags.any(axis=1))
+        ]
+
+    def _create_alert(self, row, timestamp, values, flags) -> dict:
+        return {
+            "vehicle_id": self.vehicle_ids[row],
+            "timestamp": float(timestamp),
+            "alerts": [
+                {
+                    "rule": rule,
+                    "reading": reading,
+                    "value": float(values[ECU_READINGS.index(reading)]),
+                }
+                for (rule, reading), flag in zip(self.rules, flags)
+                if flag
+            ],
+        }
+
+    def _get_row(self, vehicle_id: str) -> int:
+        row = self.rows.get(vehicle_id)
+        if row is None:
+            row = self.rows[vehicle_id] = len(self.vehicle_ids)
+            self.vehicle_ids.append(vehicle_id)
+            if row == len(self.counts):
+                self._grow()
+        return row
+
+    def _grow(self) -> None:
+        # Double the capacity of every per-vehicle array
+        for name, fill in (
+            ("last_values", math.nan),
+            ("last_timestamps", math.nan),
+            ("means", 0),
+            ("variances", 0),
+            ("counts", 0),
+            ("failing", False),
+        ):
+            array = getattr(self, name)
+            setattr(self, name, np.concatenate([array, np.full_like(array, fill)]))
+
+
+class AnomalyDetectionSubscriber(MQTTSubscriber):
+    """
+    Micro-batches `fleet/data` messages, evaluates them with `AnomalyDetector`
+    and publishes the alerts to `fleet/{id}/alerts` on the same broker.
+    """
+
+    def __init__(
+        self,
+        broker,
+        port,
+        mqtt_topic="fleet/data",
+        shards=None,
+        batch_interval=0.5,
+        max_batch_size=10000,
+    ):
+        self.detector = AnomalyDetector()
+        self.batch_interval = batch_interval
+        self.max_batch_size = max_batch_size
+        self._batch = []
+        self._batch_lock = threading.Lock()
+        self._batch_full = threading.Event()
+        self._dropped = 0
+        super().__init__(broker, port, mqtt_topic, shards)
+
+    def start(self):
+        threading.Thread(target=self._process_batches, daemon=True).start()
+        super().start()
+
+    def _process_batches(self):
+        while True:
+            # Wait for the batch interval, or less if the batch fills up
+            self._batch_full.wait(self.batch_interval)
+            self._batch_full.clear()
+
+            with self._batch_lock:
+                batch, self._batch = self._batch, []
+                dropped, self._dropped = self._dropped, 0
+            if dropped:
+                print(f"Detector falling behind, {dropped} readings dropped")
+            if not batch:
+                continue
+
+            # A failing batch must not stop the thread, readings would pile up
+            try:
+                self._evaluate_batch(batch)
+            except Exception as exc:
+                print(f"Failed to evaluate {len(batch)} readings: {exc!r}")
+
+    def _evaluate_batch(self, batch):
+        clients, vehicle_ids, timestamps, values = zip(*batch)
+        # Alerts go back to the shard the vehicle publishes to, a vehicle is
+        # always on the same shard
+        vehicle_clients = dict(zip(vehicle_ids, clients))
+        for alert in self.detector.evaluate(vehicle_ids, timestamps, values):
+            vehicle_clients[alert["vehicle_id"]].publish(
+                ALERTS_TOPIC.format(id=alert["vehicle_id"]), json.dumps(alert)
+            )
+            print(f"Alert: {alert}")
+
+    def _on_message(self, client, userdata, msg):
+        try:
+            data = json.loads(msg.payload)
+            if not isinstance(data["id"], str):
+                raise TypeError(f"vehicle id must be a string, got {data['id']!r}")
+            # Converted here so an invalid value is rejected with its message
+            # instead of failing the whole batch
+            timestamp = float(data["gps"]["timestamp"])
+            if not math.isfinite(timestamp):
+                raise ValueError(f"timestamp must be finite, got {timestamp!r}")
+            reading = (
+                client,
+                data["id"],
+                timestamp,
+                tuple(float(data["ecu"][reading]) for reading in ECU_READINGS),
+            )
+        except (ValueError, KeyError, TypeError) as exc:
+            print(f"Invalid message on {msg.topic}: {exc!r}")
+            return
+
+        with self._batch_lock:
+            if len(self._batch) >= self.max_batch_size * MAX_PENDING_BATCHES:
+                self._dropped += 1
+                return
+            self._batch.append(reading)
+            if len(self._batch) >= self.max_batch_size:
+                self._batch_full.set()
+
+
+def main(
+    mqtt_broker: str = "localhost",
+    port: int = 1883,
+    broker_pool: str = None,
+    batch_interval: float = 0.5,
+) -> None:
+    # With a broker pool file, mqtt_broker is a logical broker and readings are
+    # received from all of its shards
+    if broker_pool:
+        subscriber = AnomalyDetectionSubscriber.from_broker_pool(
+            BrokerPool.from_file(broker_pool),
+            mqtt_broker,
+            "fleet/data",
+            batch_interval=batch_interval,
+        )
+    else:
+        subscriber = AnomalyDetectionSubscriber(
+            mqtt_broker, port, "fleet/data", batch_interval=batch_interval
+        )
+    subscriber.start()
+
+
+if __name__ == "__main__":
+    import typer
+
+    typer.run(main)
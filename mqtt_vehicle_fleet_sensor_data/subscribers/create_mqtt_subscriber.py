@@ -1,10 +1,22 @@
+from mqtt_vehicle_fleet_sensor_data.brokers import BrokerPool
 from mqtt_vehicle_fleet_sensor_data.subscribers.mqtt_subscriber import MQTTSubscriber
 import typer
 
 
-def main(mqtt_topic: str, mqtt_broker: str, port: int) -> None:
-    
-    subscriber = MQTTSubscriber(mqtt_broker, port, mqtt_topic)
+def main(
+    mqtt_topic: str,
+    mqtt_broker: str,
+    port: int = typer.Argument(1883),
+    broker_pool: str = None,
+) -> None:
+    # With a broker pool file, mqtt_broker is a logical broker (fleet, vans,
+    # trucks) and messages are received from all of its shards
+    if broker_pool:
+        subscriber = MQTTSubscriber.from_broker_pool(
+            BrokerPool.from_file(broker_pool), mqtt_broker, mqtt_topic
+        )
+    else:
+        subscriber = MQTTSubscriber(mqtt_broker, port, mqtt_topic)
     subscriber.start()
 
 
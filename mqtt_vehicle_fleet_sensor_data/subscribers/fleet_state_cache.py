@@ -0,0 +1,288 @@
+from array import array
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import math
+import os
+from socketserver import ThreadingMixIn, UnixStreamServer
+import stat
+import threading
+import time
+from urllib.parse import unquote
+
+from mqtt_vehicle_fleet_sensor_data.brokers import BrokerPool
+from mqtt_vehicle_fleet_sensor_data.subscribers.mqtt_subscriber import MQTTSubscriber
+from mqtt_vehicle_fleet_sensor_data.utils import flatten
+
+# Columns of the table, `fleet/data` payload keys flattened as in the offline
+# datasets, plus when the record was received
+FIELDS = (
+    "gps.timestamp",
+    "gps.lat",
+    "gps.lon",
+    "ecu.ect",
+    "ecu.iat",
+    "ecu.map",
+    "ecu.fuel-press",
+    "ecu.oxygen",
+    "ecu.vss",
+    "cabin-temp",
+    "cargo_temperature",
+    "trailer_pressure",
+    "received_at",
+)
+# Fields a vehicle never reported, e.g. trailer pressure of a van
+MISSING = math.nan
+# Most of the time spent building snapshots, large fleets are refreshed less
+# often than `snapshot_refresh` so ingestion is not starved of the GIL
+MAX_SNAPSHOT_SHARE = 0.2
+
+
+class FleetStateTable:
+    """
+    Latest record of every vehicle, kept as rows of a single array of floats so
+    the table stays compact however large the fleet is.
+    """
+
+    def __init__(self) -> None:
+        self.vehicle_ids = []  # Row to vehicle id
+        self.rows = {}  # Vehicle id to row
+        self.values = array("d")
+        self.version = 0
+        self._lock = threading.Lock()
+        # Serialised snapshot and the version it was built from
+        self._snapshot = (-1, b"")
+        self.build_snapshot()
+
+    def update(self, msg: dict) -> None:
+        """
+        Store a `fleet/data` payload as the vehicle's latest record. Raises
+        ValueError or TypeError, leaving the table untouched, if it is invalid.
+        """
+        vehicle_id = msg["id"]
+        if not isinstance(vehicle_id, str):
+            raise TypeError(f"Vehicle id must be a string, got {vehicle_id!r}")
+
+        # Convert every value before touching the table, so an invalid payload
+        # never leaves a new or half-written row behind
+        record = flatten(msg)
+        record["received_at"] = time.time()
+        columns = [
+            (column, float(record[field]))
+            for column, field in enumerate(FIELDS)
+            if field in record
+        ]
+
+        with self._lock:
+            row = self.rows.get(vehicle_id)
+            if row is None:
+                row = self.rows[vehicle_id] = len(self.vehicle_ids)
+                self.vehicle_ids.append(vehicle_id)
+                self.values.extend([MISSING] * len(FIELDS))
+
+            offset = row * len(FIELDS)
+            for column, value in columns:
+                self.values[offset + column] = value
+            self.version += 1
+
+    def get(self, vehicle_id: str) -> dict:
+        """Latest record of a vehicle, None if it has not published yet."""
+        with self._lock:
+            row = self.rows.get(vehicle_id)
+            if row is None:
+                return None
+            values = self.values[row * len(FIELDS) : (row + 1) * len(FIELDS)]
+        return self._to_record(values)
+
+    def snapshot(self) -> bytes:
+        """
+        JSON snapshot of the whole fleet as of the last `build_snapshot`. It is
+        never built on the request path, every request is served the same bytes.
+        """
+        return self._snapshot[1]
+
+    @property
+    def snapshot_version(self) -> int:
+        return self._snapshot[0]
+
+    def build_snapshot(self) -> bool:
+        """Rebuild the snapshot if the table has changed, returns whether it did."""
+        if self._snapshot[0] == self.version:
+            return False
+
+        # Copy under the lock so the snapshot is consistent, serialise outside it
+        with self._lock:
+            version = self.version
+            vehicle_ids = list(self.vehicle_ids)
+            values = self.values[:]
+
+        vehicles = {
+            vehicle_id: self._to_record(
+                values[row * len(FIELDS) : (row + 1) * len(FIELDS)]
+            )
+            for row, vehicle_id in enumerate(vehicle_ids)
+        }
+        snapshot = json.dumps(
+            {"version": version, "built_at": time.time(), "vehicles": vehicles}
+        ).encode()
+        self._snapshot = (version, snapshot)
+        return True
+
+    @staticmethod
+    def _to_record(values) -> dict:
+        return {
+            field: value
+            for field, value in zip(FIELDS, values)
+            if not math.isnan(value)
+        }
+
+
+class FleetStateRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET /vehicles       Snapshot of the whole fleet
+    GET /vehicles/<id>  Latest record of a vehicle
+    """
+
+    def do_GET(self):
+        table = self.server.table
+
+        if self.path == "/vehicles":
+            self._send(200, table.snapshot())
+        elif self.path.startswith("/vehicles/"):
+            record = table.get(unquote(self.path.removeprefix("/vehicles/")))
+            if record is None:
+                self._send(404, b'{"error": "vehicle not found"}')
+            else:
+                self._send(200, json.dumps(record).encode())
+        else:
+            self._send(404, b'{"error": "not found"}')
+
+    def _send(self, status: int, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Requests are not logged, the cache can be polled very frequently
+        pass
+
+
+class UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+
+class FleetStateCache(MQTTSubscriber):
+    """
+    Keeps the latest GPS, ECU and cargo/trailer record of every vehicle from
+    `fleet/data`, serves it over HTTP (TCP or Unix socket) and periodically
+    publishes a retained snapshot so new subscribers get the fleet state
+    straight away.
+
+    The fleet snapshot is rebuilt in the background every `snapshot_refresh`
+    seconds, or less often when building it takes long, so requests never pay
+    for building it.
+    """
+
+    def __init__(
+        self,
+        broker,
+        port,
+        mqtt_topic="fleet/data",
+        shards=None,
+        snapshot_topic="fleet/state",
+        snapshot_interval=5.0,
+        snapshot_refresh=1.0,
+    ):
+        self.table = FleetStateTable()
+        self.snapshot_topic = snapshot_topic
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_refresh = snapshot_refresh
+        super().__init__(broker, port, mqtt_topic, shards)
+
+    def serve(self, http_host="localhost", http_port=8080, unix_socket=None):
+        """Start the query API in a background thread, on a Unix socket if given."""
+        if unix_socket:
+            # A socket left by a previous run is replaced, anything else is kept
+            if os.path.exists(unix_socket):
+                if not stat.S_ISSOCK(os.stat(unix_socket).st_mode):
+                    raise FileExistsError(f"{unix_socket} exists and is not a socket")
+                os.remove(unix_socket)
+            server = UnixHTTPServer(unix_socket, FleetStateRequestHandler)
+        else:
+            server = ThreadingHTTPServer(
+                (http_host, http_port), FleetStateRequestHandler
+            )
+        server.table = self.table
+
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def start(self):
+        threading.Thread(target=self._refresh_snapshots, daemon=True).start()
+        super().start()
+
+    def _refresh_snapshots(self):
+        # Each shard client has its own published version, a shard that was
+        # disconnected gets the snapshot once it is back
+        published_versions = {}
+        last_published = time.monotonic()
+        build_time = 0.0
+        while True:
+            time.sleep(max(self.snapshot_refresh, build_time / MAX_SNAPSHOT_SHARE))
+            started = time.monotonic()
+            if self.table.build_snapshot():
+                build_time = time.monotonic() - started
+
+            if time.monotonic() - last_published < self.snapshot_interval:
+                continue
+            last_published = time.monotonic()
+
+            # Subscribers may be connected to any shard of the logical broker,
+            # so every shard retains the snapshot
+            version, snapshot = self.table.snapshot_version, self.table.snapshot()
+            for client in [self.client, *self.shard_clients]:
+                if client.is_connected() and published_versions.get(client) != version:
+                    client.publish(self.snapshot_topic, snapshot, retain=True)
+                    published_versions[client] = version
+
+    def _on_message(self, client, userdata, msg):
+        try:
+            self.table.update(json.loads(msg.payload))
+        except (ValueError, KeyError, TypeError) as exc:
+            print(f"Invalid message on {msg.topic}: {exc}")
+
+
+def main(
+    mqtt_broker: str = "localhost",
+    port: int = 1883,
+    broker_pool: str = None,
+    http_host: str = "localhost",
+    http_port: int = 8080,
+    unix_socket: str = None,
+    snapshot_topic: str = "fleet/state",
+    snapshot_interval: float = 5.0,
+    snapshot_refresh: float = 1.0,
+) -> None:
+    # With a broker pool file, mqtt_broker is a logical broker and the cache
+    # receives from and publishes snapshots to all of its shards
+    options = {
+        "snapshot_topic": snapshot_topic,
+        "snapshot_interval": snapshot_interval,
+        "snapshot_refresh": snapshot_refresh,
+    }
+    if broker_pool:
+        cache = FleetStateCache.from_broker_pool(
+            BrokerPool.from_file(broker_pool), mqtt_broker, "fleet/data", **options
+        )
+    else:
+        cache = FleetStateCache(mqtt_broker, port, "fleet/data", **options)
+
+    cache.serve(http_host, http_port, unix_socket)
+    cache.start()
+
+
+if __name__ == "__main__":
+    import typer
+
+    typer.run(main)
@@ -1,29 +1,51 @@
 import paho.mqtt.client as mqtt
+from mqtt_vehicle_fleet_sensor_data.brokers import BrokerPool
 
 
 class MQTTSubscriber:
-    def __init__(self, broker, port, mqtt_topic):
+    def __init__(self, broker, port, mqtt_topic, shards=None):
         self.broker = broker
         self.port = port
         self.topic = mqtt_topic
+        # Other endpoints of the same logical broker to fan in messages from
+        self.shards = shards or []
 
         self._create_client()
-    
+
+    @classmethod
+    def from_broker_pool(
+        cls, broker_pool: BrokerPool, broker_name, mqtt_topic, **kwargs
+    ):
+        """Subscribe to `mqtt_topic` on every shard of a logical broker."""
+        main_shard, *shards = broker_pool.get_endpoints(broker_name)
+        return cls(main_shard["host"], main_shard["port"], mqtt_topic, shards, **kwargs)
+
     def start(self):
 
         try:
+            # Shards run their network loop in background threads, all of them
+            # share the callbacks so messages are handled as if from one broker
+            for client, shard in zip(self.shard_clients, self.shards):
+                client.connect(shard["host"], shard["port"], 60)
+                client.loop_start()
+
             self.client.connect(self.broker, self.port, 60)
             self.client.loop_forever()
         except ConnectionRefusedError as exc:
             print(f"{exc.__class__.__name__}: {exc}")
 
     def _create_client(self):
-        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        self.client = self._new_client()
+        self.shard_clients = [self._new_client() for _ in self.shards]
+
+    def _new_client(self):
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
         # Assign callbacks
-        self.client.on_connect = self._on_connect
-        self.client.on_message = self._on_message
-        self.client.on_subscribe = self._on_subscribe
-        self.client.on_unsubscribe = self._on_unsubscribe
+        client.on_connect = self._on_connect
+        client.on_message = self._on_message
+        client.on_subscribe = self._on_subscribe
+        client.on_unsubscribe = self._on_unsubscribe
+        return client
 
     def _on_connect(self, client, userdata, flags, reason_code, properties):
         """The callback for when the client receives a CONNACK response from the server"""
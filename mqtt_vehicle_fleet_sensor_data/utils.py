@@ -24,3 +24,27 @@ def calculate_temperature_from_voltage(voltage):
     # Convert Kelvin to Celsius
     T_celsius = T_kelvin - 273.15
     return T_celsius
+
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_distance(point_a, point_b):
+    """Great-circle distance in km between two (lat, lon) points in degrees."""
+    lat_a, lon_a, lat_b, lon_b = map(math.radians, (*point_a, *point_b))
+    h = (
+        math.sin((lat_b - lat_a) / 2) ** 2
+        + math.cos(lat_a) * math.cos(lat_b) * math.sin((lon_b - lon_a) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+
+def flatten(msg: dict, prefix: str = "") -> dict:
+    """Flatten a payload keeping its keys, e.g. {"gps": {"lat": 1}} -> {"gps.lat": 1}."""
+    record = {}
+    for key, value in msg.items():
+        if isinstance(value, dict):
+            record.update(flatten(value, f"{prefix}{key}."))
+        else:
+            record[f"{prefix}{key}"] = value
+    return record
@@ -0,0 +1,198 @@
+import json
+import math
+import random
+import threading
+import time
+from types import SimpleNamespace
+import warnings
+
+import numpy as np
+import pytest
+
+from mqtt_vehicle_fleet_sensor_data.publishers.generate_telemetry import (
+    SimulatedClock,
+)
+from mqtt_vehicle_fleet_sensor_data.publishers.vehicle_base import ECU_READINGS
+from mqtt_vehicle_fleet_sensor_data.publishers.vehicles import Van
+from mqtt_vehicle_fleet_sensor_data.subscribers.anomaly_detector import (
+    AnomalyDetectionSubscriber,
+    AnomalyDetector,
+)
+
+FAULT_AT = 100
+
+
+def _run_fleet(vehicle_number: int, seconds: int, fault=None) -> list:
+    """
+    Drive a fleet of vans in simulated time, a reading per second each, and
+    return the alerts raised. `fault` is injected into van-0's ECU at FAULT_AT.
+    """
+    random.seed(0)
+    clock = SimulatedClock(0.0)
+    vans = [Van(f"van-{i}", "dublin-limerick") for i in range(vehicle_number)]
+    for van in vans:
+        van.gps.clock = clock
+
+    detector = AnomalyDetector()
+    alerts = []
+    for second in range(seconds):
+        clock.now = float(second)
+        if fault and second == FAULT_AT:
+            vans[0].ecu.inject_fault(*fault)
+
+        msgs = [van.collect_data()["data"]["msg"] for van in vans]
+        alerts += detector.evaluate(
+            [msg["id"] for msg in msgs],
+            [msg["gps"]["timestamp"] for msg in msgs],
+            [[msg["ecu"][reading] for reading in ECU_READINGS] for msg in msgs],
+        )
+    return alerts
+
+
+def test_clean_fleet_stays_quiet():
+    assert _run_fleet(20, 600) == []
+
+
+@pytest.mark.parametrize(
+    "fault, rule, reading",
+    [
+        # Overheating engine
+        (("ect", 120.0), "threshold", "ect"),
+        # O2 sensor drifting lean
+        (("oxygen", lambda voltage: voltage * 0.2), "lean", "oxygen"),
+        # Implausible jump in speed
+        (("vss", lambda speed: speed + 60), "rate", "vss"),
+    ],
+)
+def test_fault_raises_one_alert(fault, rule, reading):
+    alerts = _run_fleet(5, 300, fault)
+
+    # The fault persists, but only its onset is alerted
+    assert len(alerts) == 1
+    alert = alerts[0]
+    assert alert["vehicle_id"] == "van-0"
+    assert alert["timestamp"] >= FAULT_AT
+    assert {"rule": rule, "reading": reading} in [
+        {"rule": a["rule"], "reading": a["reading"]} for a in alert["alerts"]
+    ]
+
+
+def test_readings_of_a_vehicle_are_evaluated_in_order():
+    detector = AnomalyDetector(capacity=1)
+    normal = [20.0, 20.0, 1.0, 2.0, 0.5, 100.0]
+    fast = normal[:5] + [200.0]
+
+    # Out of order within the batch, 100 -> 200 in one second is too fast
+    alerts = detector.evaluate(
+        ["van-1", "van-2", "van-1"], [2, 1, 1], [fast, normal, normal]
+    )
+    assert [(a["vehicle_id"], a["timestamp"]) for a in alerts] == [("van-1", 2.0)]
+    assert alerts[0]["alerts"] == [{"rule": "rate", "reading": "vss", "value": 200.0}]
+
+
+def test_non_finite_readings_alert_without_breaking_statistics():
+    detector = AnomalyDetector(capacity=1)
+    normal = [20.0, 20.0, 1.0, 2.0, 0.5, 100.0]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        alerts = []
+        for second in range(40):
+            values = list(normal)
+            if second == 35:
+                values[0], values[4] = math.inf, math.nan
+            alerts += detector.evaluate(["van-1"], [second], [values])
+        alerts += detector.evaluate(["van-1"], [40], [normal[:5] + [200.0]])
+
+    # Only the onset of the bad readings alerts, the vehicle is still evaluated
+    assert [
+        [(a["rule"], a["reading"], a["value"]) for a in alert["alerts"]]
+        for alert in alerts
+    ] == [
+        [
+            ("threshold", "ect", math.inf),
+            ("threshold", "oxygen", pytest.approx(math.nan, nan_ok=True)),
+        ],
+        [("rate", "vss", 200.0)],
+    ]
+    assert np.isfinite(detector.means).all() and np.isfinite(detector.variances).all()
+
+
+def _message(payload) -> SimpleNamespace:
+    return SimpleNamespace(topic="fleet/data", payload=json.dumps(payload))
+
+
+def _payload(**ecu):
+    return {
+        "id": "van-1",
+        "gps": {"timestamp": 1.0},
+        "ecu": {**dict.fromkeys(ECU_READINGS, 1.0), **ecu},
+    }
+
+
+def test_subscriber_rejects_invalid_messages():
+    subscriber = AnomalyDetectionSubscriber("localhost", 1883)
+
+    subscriber._on_message(None, None, _message(_payload(ect="hot")))
+    subscriber._on_message(None, None, _message({**_payload(), "id": None}))
+    subscriber._on_message(None, None, _message({"id": "van-1"}))
+    subscriber._on_message(None, None, SimpleNamespace(topic="x", payload=b"{"))
+    subscriber._on_message(
+        None, None, _message({**_payload(), "gps": {"timestamp": "nan"}})
+    )
+    assert subscriber._batch == []
+
+    subscriber._on_message(None, None, _message(_payload(ect=20)))
+    assert subscriber._batch == [(None, "van-1", 1.0, (20.0, 1.0, 1.0, 1.0, 1.0, 1.0))]
+
+
+def test_subscriber_caps_pending_readings():
+    subscriber = AnomalyDetectionSubscriber("localhost", 1883, max_batch_size=2)
+    for _ in range(50):
+        subscriber._on_message(None, None, _message(_payload()))
+
+    assert len(subscriber._batch) == 20
+    assert subscriber._dropped == 30
+
+
+def test_batch_thread_survives_failing_batches(monkeypatch):
+    subscriber = AnomalyDetectionSubscriber("localhost", 1883, batch_interval=0.01)
+    published = []
+    client = SimpleNamespace(publish=lambda *args: published.append(args))
+    evaluate = subscriber.detector.evaluate
+    calls = []
+
+    def fail_once(*args):
+        calls.append(args)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        return evaluate(*args)
+
+    monkeypatch.setattr(subscriber.detector, "evaluate", fail_once)
+    threading.Thread(target=subscriber._process_batches, daemon=True).start()
+
+    subscriber._on_message(client, None, _message(_payload()))
+    time.sleep(0.1)
+    subscriber._on_message(client, None, _message(_payload(ect=120.0)))
+    time.sleep(0.1)
+
+    assert len(calls) == 2
+    assert [topic for topic, _ in published] == ["fleet/van-1/alerts"]
+
+
+def test_alerts_are_published_on_the_shard_of_the_vehicle():
+    subscriber = AnomalyDetectionSubscriber("localhost", 1883)
+    shards = [SimpleNamespace(published=[]) for _ in range(2)]
+    for shard in shards:
+        shard.publish = lambda *args, shard=shard: shard.published.append(args)
+
+    subscriber._on_message(shards[0], None, _message(_payload(ect=120.0)))
+    subscriber._on_message(
+        shards[1], None, _message({**_payload(ect=120.0), "id": "van-2"})
+    )
+    subscriber._evaluate_batch(subscriber._batch)
+
+    assert [[topic for topic, _ in shard.published] for shard in shards] == [
+        ["fleet/van-1/alerts"],
+        ["fleet/van-2/alerts"],
+    ]
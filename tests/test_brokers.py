@@ -0,0 +1,93 @@
+import pytest
+
+from mqtt_vehicle_fleet_sensor_data.brokers import BrokerPool, HashRing, parse_endpoint
+
+VEHICLE_IDS = [f"van-{n}" for n in range(10000)]
+
+
+def _endpoints(count):
+    return [{"host": "localhost", "port": 1883 + n} for n in range(count)]
+
+
+def test_parse_endpoint():
+    assert parse_endpoint("localhost:1883") == {"host": "localhost", "port": 1883}
+    assert parse_endpoint("::1:1883") == {"host": "::1", "port": 1883}
+
+
+@pytest.mark.parametrize(
+    "endpoint", ["localhost", "localhost:", ":1883", "1883", "localhost:port", ""]
+)
+def test_parse_endpoint_invalid(endpoint):
+    with pytest.raises(ValueError, match="expected host:port"):
+        parse_endpoint(endpoint)
+
+
+def test_hash_ring_needs_endpoints():
+    with pytest.raises(ValueError):
+        HashRing([])
+
+
+def test_hash_ring_is_stable():
+    first, second = HashRing(_endpoints(4)), HashRing(_endpoints(4))
+    assert all(first.get_endpoint(id) == second.get_endpoint(id) for id in VEHICLE_IDS)
+
+
+def test_hash_ring_spreads_keys():
+    ring = HashRing(_endpoints(4))
+    counts = {}
+    for id in VEHICLE_IDS:
+        port = ring.get_endpoint(id)["port"]
+        counts[port] = counts.get(port, 0) + 1
+
+    assert len(counts) == 4
+    # Each endpoint gets a quarter of the keys, give or take
+    assert all(1500 < count < 3500 for count in counts.values())
+
+
+def test_hash_ring_moves_about_one_nth_of_keys():
+    before, after = HashRing(_endpoints(4)), HashRing(_endpoints(5))
+    moved = [
+        id for id in VEHICLE_IDS if before.get_endpoint(id) != after.get_endpoint(id)
+    ]
+
+    # Adding a fifth endpoint only moves keys onto it, about 1/5 of them
+    assert all(after.get_endpoint(id)["port"] == 1887 for id in moved)
+    assert 0.15 < len(moved) / len(VEHICLE_IDS) < 0.25
+
+
+def test_broker_pool_defaults():
+    pool = BrokerPool()
+    assert pool.get_broker("vans", "van-1") == {
+        "name": "vans",
+        "host": "localhost",
+        "port": 1884,
+    }
+    assert pool.get_endpoints("fleet") == [{"host": "localhost", "port": 1883}]
+
+
+def test_broker_pool_from_file(tmp_path):
+    config = tmp_path / "brokers.toml"
+    config.write_text('[brokers]\nfleet = ["localhost:1883", "localhost:1886"]\n')
+
+    pool = BrokerPool.from_file(config)
+    assert len(pool.get_endpoints("fleet")) == 2
+    # Logical brokers missing from the file keep their default endpoint
+    assert pool.get_endpoints("trucks") == [{"host": "localhost", "port": 1885}]
+
+
+@pytest.mark.parametrize(
+    "brokers, error",
+    [
+        ('van = ["localhost:1884"]', "Unknown logical brokers"),
+        ('fleet = "localhost:1883"', "non-empty list"),
+        ("fleet = []", "non-empty list"),
+        ("fleet = [1883]", "non-empty list"),
+        ('fleet = ["localhost"]', "expected host:port"),
+    ],
+)
+def test_broker_pool_from_invalid_file(tmp_path, brokers, error):
+    config = tmp_path / "brokers.toml"
+    config.write_text(f"[brokers]\n{brokers}\n")
+
+    with pytest.raises(ValueError, match=error):
+        BrokerPool.from_file(config)
@@ -0,0 +1,115 @@
+from collections import Counter
+import csv
+import json
+
+import pytest
+
+from mqtt_vehicle_fleet_sensor_data.iot import routes
+from mqtt_vehicle_fleet_sensor_data.iot.clean_routes import (
+    drop_duplicates_and_outliers,
+    main,
+    resample,
+    simplify,
+    write_route,
+)
+from mqtt_vehicle_fleet_sensor_data.utils import haversine_distance
+
+# About 1.1 km between consecutive points
+PATH = [(53.0 + i * 0.01, -6.0) for i in range(10)]
+
+
+def _clean(points, max_outliers=3):
+    dropped = Counter()
+    kept = list(drop_duplicates_and_outliers([points], 5.0, dropped, max_outliers))
+    return kept, dropped
+
+
+def test_drop_duplicates_and_outliers():
+    glitch = (54.0, -6.0)
+    points = PATH[:3] + [PATH[2], glitch] + PATH[3:]
+
+    kept, dropped = _clean(points)
+    assert kept == PATH
+    assert dropped == Counter(duplicates=1, outliers=1)
+
+
+def test_outliers_are_measured_from_the_last_kept_point():
+    # Two glitches in a row that are far from each other are both dropped
+    kept, dropped = _clean(PATH[:5] + [(54.0, -6.0), (52.0, -6.0)] + PATH[5:])
+    assert kept == PATH
+    assert dropped["outliers"] == 2
+
+
+def test_route_goes_on_after_a_gap():
+    # A real gap: the route carries on 50 km further
+    after_gap = [(lat + 0.5, lon) for lat, lon in PATH]
+    kept, dropped = _clean(PATH + after_gap)
+
+    assert kept == PATH + after_gap
+    assert dropped == Counter(gaps=1)
+
+
+def test_outliers_at_the_end_are_counted():
+    kept, dropped = _clean(PATH + [(54.0, -6.0), (54.01, -6.0)])
+    assert kept == PATH
+    assert dropped["outliers"] == 2
+
+
+def test_simplify_keeps_corners():
+    corner = [(PATH[-1][0], -6.0 + i * 0.01) for i in range(10)]
+    points = PATH + corner[1:]
+    # A straight line with a 1 m kink is only its end points
+    points[5] = (points[5][0], points[5][1] + 0.00001)
+
+    assert simplify(PATH, 10) == [PATH[0], PATH[-1]]
+    assert simplify(PATH[:2], 10) == PATH[:2]
+    assert simplify(points, 10) == [PATH[0], PATH[-1], corner[-1]]
+    assert points[5] in simplify(points, 0.1)
+
+
+def test_resample():
+    points = list(resample(PATH, 250))
+
+    assert points[0] == PATH[0]
+    distances = [haversine_distance(a, b) for a, b in zip(points, points[1:])]
+    assert distances == pytest.approx([0.25] * len(distances), abs=1e-6)
+    total = sum(haversine_distance(a, b) for a, b in zip(PATH, PATH[1:]))
+    assert len(points) == int(total / 0.25) + 1
+
+
+def test_write_route_round_trip(tmp_path, monkeypatch):
+    points = list(resample(PATH, 100))
+    metadata = write_route("test", points, tmp_path)
+
+    monkeypatch.setattr(routes, "CLEAN_ROUTES_PATH", str(tmp_path))
+    routes.load_route.cache_clear()
+    try:
+        # The binary route is preferred, both hold exactly the written points
+        assert routes.load_route("test") == tuple(points)
+        (tmp_path / "test-clean.bin").unlink()
+        routes.load_route.cache_clear()
+        assert routes.load_route("test") == tuple(points)
+    finally:
+        routes.load_route.cache_clear()
+
+    with open(tmp_path / "test-clean.json") as file:
+        assert json.load(file) == metadata
+    assert metadata["point_count"] == len(points)
+    assert metadata["length_km"] == pytest.approx(0.1 * (len(points) - 1), abs=1e-3)
+
+
+@pytest.mark.parametrize("route", routes.available_routes())
+def test_binary_routes_match_csv(route):
+    with open(routes.get_route_path(route), newline="") as file:
+        reader = csv.reader(file)
+        next(reader)
+        points = tuple((float(lat), float(lon)) for lat, lon in reader)
+
+    assert routes.load_route(route) == points
+    assert routes.load_route_metadata(route)["point_count"] == len(points)
+
+
+def test_unknown_routes_are_rejected(tmp_path):
+    with pytest.raises(ValueError, match="dublin-corck"):
+        main(routes=["dublin-corck"], output_dir=str(tmp_path))
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,144 @@
+import json
+import socket
+import threading
+import time
+from urllib.request import urlopen
+from urllib.error import HTTPError
+
+import pytest
+
+from mqtt_vehicle_fleet_sensor_data.subscribers.fleet_state_cache import (
+    FleetStateCache,
+    FleetStateTable,
+)
+
+VAN_DATA = {
+    "id": "van-1",
+    "gps": {"id": "gps-1", "timestamp": 1.0, "lat": 53.3, "lon": -6.2},
+    "ecu": {"ect": 90.0, "vss": 20.0},
+    "cabin-temp": 21.0,
+    "cargo_temperature": 4.0,
+}
+
+
+class FakeClient:
+    def __init__(self) -> None:
+        self.published = []
+
+    def is_connected(self):
+        return True
+
+    def publish(self, topic, payload, retain=False):
+        self.published.append((topic, payload, retain))
+
+
+def test_update_and_get():
+    table = FleetStateTable()
+    table.update(VAN_DATA)
+
+    record = table.get("van-1")
+    assert record["gps.lat"] == 53.3
+    assert record["ecu.ect"] == 90.0
+    assert "trailer_pressure" not in record
+    assert table.get("van-2") is None
+
+
+@pytest.mark.parametrize(
+    "msg",
+    [
+        {"id": "van-9", "gps": {"timestamp": "x"}},
+        {"id": "van-9", "gps": {"timestamp": 1.0, "lat": None}},
+        {"id": 9, "gps": {"timestamp": 1.0}},
+        {"gps": {"timestamp": 1.0}},
+    ],
+)
+def test_invalid_update_leaves_table_untouched(msg):
+    table = FleetStateTable()
+    table.update(VAN_DATA)
+    values = table.values.tobytes()
+
+    with pytest.raises((ValueError, TypeError, KeyError)):
+        table.update(msg)
+    assert table.get("van-9") is None
+    assert table.values.tobytes() == values
+    assert table.version == 1
+
+
+def test_snapshot_is_only_built_in_the_background():
+    table = FleetStateTable()
+    assert json.loads(table.snapshot())["vehicles"] == {}
+
+    table.update(VAN_DATA)
+    # Requests keep getting the last built snapshot until it is rebuilt
+    assert json.loads(table.snapshot())["vehicles"] == {}
+    assert table.build_snapshot()
+    assert not table.build_snapshot()
+
+    snapshot = json.loads(table.snapshot())
+    assert snapshot["version"] == table.snapshot_version == 1
+    assert snapshot["vehicles"]["van-1"]["cargo_temperature"] == 4.0
+
+
+def test_http_api():
+    cache = FleetStateCache("localhost", 1883)
+    cache.table.update(VAN_DATA)
+    cache.table.build_snapshot()
+    server = cache.serve(http_port=0)
+    url = f"http://localhost:{server.server_address[1]}"
+    try:
+        with urlopen(f"{url}/vehicles") as response:
+            assert "van-1" in json.load(response)["vehicles"]
+        with urlopen(f"{url}/vehicles/van-1") as response:
+            assert json.load(response)["gps.lon"] == -6.2
+        with pytest.raises(HTTPError) as exc_info:
+            urlopen(f"{url}/vehicles/van-9")
+        assert exc_info.value.code == 404
+    finally:
+        server.shutdown()
+
+
+def test_unix_socket_replaces_stale_socket(tmp_path):
+    path = str(tmp_path / "cache.sock")
+    with socket.socket(socket.AF_UNIX) as stale:
+        stale.bind(path)
+
+    cache = FleetStateCache("localhost", 1883)
+    cache.table.update(VAN_DATA)
+    cache.table.build_snapshot()
+    server = cache.serve(unix_socket=path)
+    try:
+        with socket.socket(socket.AF_UNIX) as client:
+            client.connect(path)
+            client.sendall(b"GET /vehicles/van-1 HTTP/1.0\r\n\r\n")
+            response = b"".join(iter(lambda: client.recv(4096), b""))
+        assert response.startswith(b"HTTP/1.0 200")
+        assert json.loads(response.split(b"\r\n\r\n", 1)[1])["gps.lon"] == -6.2
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_unix_socket_keeps_other_files(tmp_path):
+    path = tmp_path / "cache.sock"
+    path.write_text("not a socket")
+
+    with pytest.raises(FileExistsError, match="not a socket"):
+        FleetStateCache("localhost", 1883).serve(unix_socket=str(path))
+    assert path.read_text() == "not a socket"
+
+
+def test_snapshot_is_retained_on_every_shard():
+    shards = [{"host": "localhost", "port": 1886}, {"host": "localhost", "port": 1887}]
+    cache = FleetStateCache(
+        "localhost", 1883, shards=shards, snapshot_interval=0, snapshot_refresh=0.01
+    )
+    cache.client = FakeClient()
+    cache.shard_clients = [FakeClient(), FakeClient()]
+    cache.table.update(VAN_DATA)
+
+    threading.Thread(target=cache._refresh_snapshots, daemon=True).start()
+    time.sleep(0.2)
+
+    # Published once per shard, it has not changed since
+    for client in [cache.client, *cache.shard_clients]:
+        assert client.published == [("fleet/state", cache.table.snapshot(), True)]
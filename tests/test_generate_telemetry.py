@@ -0,0 +1,103 @@
+import csv
+from pathlib import Path
+
+import pytest
+
+from mqtt_vehicle_fleet_sensor_data.publishers.create_mqtt_publishers import (
+    VehicleType,
+    build_vehicle,
+)
+from mqtt_vehicle_fleet_sensor_data.publishers.generate_telemetry import (
+    FileFormat,
+    generate_shard,
+)
+from mqtt_vehicle_fleet_sensor_data.utils import flatten
+
+VEHICLES = [
+    ("van-1", VehicleType.VAN, "dublin-limerick"),
+    ("van-2", VehicleType.VAN, "dublin-limerick"),
+    ("truck-1", VehicleType.TRUCK, "dublin-limerick"),
+]
+# 2024-01-01T23:00:00Z, so the run crosses into a second date partition
+START = 1704150000.0
+TICKS = 5400
+
+
+def _generate(output_dir, file_format, seed=0):
+    return generate_shard(
+        0, VEHICLES, START, TICKS, 1.0, output_dir, file_format, 2000, seed
+    )
+
+
+def _payload_columns(vehicle_type):
+    vehicle = build_vehicle("id", vehicle_type, "dublin-limerick")
+    return list(flatten(vehicle.collect_data()["data"]["msg"]))
+
+
+def _read_files(output_dir):
+    return {
+        path.relative_to(output_dir).as_posix(): path.read_bytes()
+        for path in sorted(Path(output_dir).rglob("*.*"))
+    }
+
+
+def test_csv_partitions_and_columns(tmp_path):
+    assert _generate(tmp_path, FileFormat.CSV) == TICKS * len(VEHICLES)
+
+    files = _read_files(tmp_path)
+    assert list(files) == [
+        "vehicle_type=truck/date=2024-01-01/shard-000-part-00000.csv",
+        "vehicle_type=truck/date=2024-01-01/shard-000-part-00001.csv",
+        "vehicle_type=truck/date=2024-01-02/shard-000-part-00002.csv",
+        "vehicle_type=van/date=2024-01-01/shard-000-part-00000.csv",
+        "vehicle_type=van/date=2024-01-01/shard-000-part-00001.csv",
+        "vehicle_type=van/date=2024-01-01/shard-000-part-00002.csv",
+        "vehicle_type=van/date=2024-01-01/shard-000-part-00003.csv",
+        "vehicle_type=van/date=2024-01-02/shard-000-part-00004.csv",
+        "vehicle_type=van/date=2024-01-02/shard-000-part-00005.csv",
+    ]
+
+    rows = 0
+    for vehicle_type in VehicleType:
+        for path in (tmp_path / f"vehicle_type={vehicle_type.value}").rglob("*.csv"):
+            with open(path, newline="") as file:
+                reader = csv.reader(file)
+                assert next(reader) == _payload_columns(vehicle_type)
+                rows += sum(1 for _ in reader)
+    assert rows == TICKS * len(VEHICLES)
+
+
+def test_parquet_matches_csv(tmp_path):
+    parquet = pytest.importorskip("pyarrow.parquet")
+    _generate(tmp_path / "csv", FileFormat.CSV)
+    _generate(tmp_path / "parquet", FileFormat.PARQUET)
+
+    csv_files = sorted((tmp_path / "csv").rglob("*.csv"))
+    parquet_files = sorted((tmp_path / "parquet").rglob("*.parquet"))
+    assert [
+        path.with_suffix("").relative_to(tmp_path / "csv") for path in csv_files
+    ] == [
+        path.with_suffix("").relative_to(tmp_path / "parquet") for path in parquet_files
+    ]
+
+    # Same seed, so both formats hold the same records
+    for csv_path, parquet_path in zip(csv_files, parquet_files):
+        with open(csv_path, newline="") as file:
+            reader = csv.reader(file)
+            columns, rows = next(reader), list(reader)
+        table = parquet.read_table(parquet_path)
+
+        assert table.column_names == columns
+        assert [
+            [str(value) for value in record.values()] for record in table.to_pylist()
+        ] == rows
+
+
+def test_same_seed_same_output(tmp_path):
+    _generate(tmp_path / "first", FileFormat.CSV, seed=7)
+    _generate(tmp_path / "second", FileFormat.CSV, seed=7)
+    _generate(tmp_path / "other", FileFormat.CSV, seed=8)
+
+    first = _read_files(tmp_path / "first")
+    assert first == _read_files(tmp_path / "second")
+    assert first != _read_files(tmp_path / "other")
@@ -0,0 +1,113 @@
+import pytest
+
+from mqtt_vehicle_fleet_sensor_data.publishers.create_mqtt_publishers import (
+    VehicleType,
+)
+from mqtt_vehicle_fleet_sensor_data.publishers.load_generator import (
+    RateController,
+    Scenario,
+)
+
+
+def _scenario(**config):
+    return Scenario({"target_rate": 100, **config})
+
+
+def test_example_scenario():
+    scenario = Scenario.from_file("scenarios/example.toml")
+
+    fleet = scenario.build_fleet()
+    assert len(fleet) == 50
+    assert fleet == scenario.build_fleet()
+    assert {route for _, _, route in fleet} <= set(scenario.route_weights)
+    assert fleet[0][0] == f"{fleet[0][1].value}-1"
+
+
+def test_ramp():
+    scenario = _scenario(ramp={"up": 10, "hold": 10, "down": 10})
+
+    assert scenario.duration == 30
+    assert scenario.target_at(5) == 50
+    assert scenario.target_at(15) == 100
+    assert scenario.target_at(25) == 50
+    assert scenario.target_at(30) == 0
+
+
+@pytest.mark.parametrize(
+    "config, error",
+    [
+        ({"topics": {"fleet/gps": 0}}, "must be above 0"),
+        ({"topics": {"fleet/gps": -1}}, "must be above 0"),
+        ({"topics": {"fleet/gps": "2"}}, "must be above 0"),
+        ({"topics": {"fleet/{vehicle}/gps": 1}}, "placeholder"),
+        ({"topics": {"fleet/{}/gps": 1}}, "placeholder"),
+        ({"vehicles": {"vans": 1}}, "Unknown keys in \\[vehicles\\]"),
+        ({"vehicles": {"van": 0}}, "mix"),
+        ({"vehicles": {"max": 0}}, "vehicles.max"),
+        ({"ramp": {"upp": 10}}, "Unknown keys in \\[ramp\\]"),
+        ({"ramp": {"curve": "cubic"}}, "Unknown ramp curve"),
+        ({"routes": {"dublin-paris": 1}}, "Unknown routes"),
+        ({"targte_rate": 100}, "Unknown keys in scenario"),
+        ({"target_rate": "fast"}, "target_rate must be"),
+        ({"target_rate": -1}, "target_rate must be"),
+        ({"target_rate": float("inf")}, "target_rate must be"),
+        ({"vehicles": {"truck": -1}}, "vehicles.truck must be"),
+        ({"ramp": {"up": -10}}, "ramp.up must be"),
+        ({"ramp": {"hold": "1m"}}, "ramp.hold must be"),
+        ({"ramp": {"max_rate_scale": 0}}, "ramp.max_rate_scale must be"),
+        ({"routes": {"dublin-limerick": 0}}, "route weight above 0"),
+        ({"routes": {"dublin-limerick": True}}, "Weight of route"),
+        ({"seed": 1.5}, "seed must be an integer"),
+    ],
+)
+def test_invalid_scenario(config, error):
+    with pytest.raises(ValueError, match=error):
+        _scenario(**config)
+
+
+def test_missing_target_rate():
+    with pytest.raises(ValueError, match="needs a target_rate"):
+        Scenario({})
+
+
+def test_vehicle_mix_defaults():
+    assert _scenario().vehicle_mix == {VehicleType.VAN: 1.0, VehicleType.TRUCK: 0.0}
+    # Naming only trucks leaves the vans out
+    scenario = _scenario(vehicles={"max": 100, "truck": 1})
+    assert scenario.vehicle_mix == {VehicleType.VAN: 0.0, VehicleType.TRUCK: 1}
+    assert {vehicle_type for _, vehicle_type, _ in scenario.build_fleet()} == {
+        VehicleType.TRUCK
+    }
+
+
+def test_topic_templates():
+    scenario = _scenario(
+        topics={"fleet/gps": 2, "fleet/{id}/ecu": 0.5},
+        vehicles={"max": 2, "van": 0, "truck": 1},
+    )
+    assert [vehicle_type for _, vehicle_type, _ in scenario.build_fleet()] == [
+        VehicleType.TRUCK,
+        VehicleType.TRUCK,
+    ]
+
+
+def test_rate_controller_activates_and_scales_vehicles():
+    rate_scales, nominal_rates = [0.0] * 4, [10.0, 10.0, 0.0, 10.0]
+    controller = RateController(rate_scales, nominal_rates, max_rate_scale=10)
+
+    controller.update(target=15, achieved=0)
+    assert controller.active == 2
+    assert rate_scales == [0.75, 0.75, 0.0, 0.0]
+
+    # Half of the expected rate was achieved, the smoothed efficiency drops to
+    # 0.75 and the rates are sped up to make up for it
+    controller.update(target=15, achieved=7.5)
+    assert controller.efficiency == 0.75
+    assert rate_scales == [1.0, 1.0, 0.0, 0.0]
+
+
+def test_saturation_without_vehicles():
+    controller = RateController([0.0], [0.0], max_rate_scale=10)
+    for _ in range(6):
+        controller.update(target=100, achieved=0)
+    assert "no vehicle is running" in controller.saturation()
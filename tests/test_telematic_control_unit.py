@@ -0,0 +1,50 @@
+from collections import Counter
+import threading
+import time
+from types import SimpleNamespace
+
+import paho.mqtt.client as mqtt
+
+from mqtt_vehicle_fleet_sensor_data.publishers.vehicles import Van
+
+
+class FakeClient:
+    """Stands in for a connected MQTT client, acknowledging every publish."""
+
+    def __init__(self, tcu, published: Counter) -> None:
+        self.tcu = tcu
+        self.published = published
+        self.mid = 0
+
+    def publish(self, topic, payload):
+        self.mid += 1
+        self.published[topic] += 1
+        self.tcu._on_publish(self, None, self.mid, None, None)
+        return SimpleNamespace(rc=mqtt.MQTT_ERR_SUCCESS, mid=self.mid)
+
+
+def _run_van(rate_scale: float, seconds: float):
+    van = Van("van-1", "dublin-limerick")
+    tcu = van.tcu
+    tcu.verbose = False
+    tcu.rate_scale = rate_scale
+    published = Counter()
+    tcu.clients = {name: FakeClient(tcu, published) for name in tcu.clients}
+    tcu.clients_connected = True
+    tcu._stablish_connection = lambda: None
+
+    threading.Thread(target=tcu.start_publishing, daemon=True).start()
+    time.sleep(seconds)
+    tcu.rate_scale = 0  # Pause the thread, it cannot be stopped
+    return van, published
+
+
+def test_rate_scale_changes_message_rate_not_driving():
+    slow_van, slow_published = _run_van(1.0, 1.5)
+    fast_van, fast_published = _run_van(10.0, 1.5)
+
+    # Every topic publishes once a second at a rate scale of 1
+    assert slow_published["fleet/data"] == 2
+    assert fast_published["fleet/data"] >= 10
+    # Both vans read their sensors, and so moved along the route, twice
+    assert slow_van.gps.position == fast_van.gps.position == 2